@@ -0,0 +1,316 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+import mino as mn
+from board import ROWS, COLUMNS, FULL_ROW, SHAPE_MASKS
+from kicktable import KickTable
+from lineclear import LineClear
+from mino import MINO_TYPES, Orientation, PieceState
+from piecequeue import PieceQueue, PREVIEW_LENGTH, TYPE_CODES
+
+NO_PIECE = -1
+BAG_SIZE = len(MINO_TYPES)
+ORIENTATIONS = list(Orientation)
+# Rows of each shape mask are padded to this many rows so that all shapes can be stored in one array
+SHAPE_ROWS = 4
+
+
+def build_shape_tables() -> tuple[np.ndarray, ...]:
+    # Shape masks from board.SHAPE_MASKS as arrays indexed by [type code, orientation]
+    shape = (len(MINO_TYPES), len(ORIENTATIONS))
+    left = np.zeros(shape, dtype=np.int64)
+    right = np.zeros(shape, dtype=np.int64)
+    bottom = np.zeros(shape, dtype=np.int64)
+    top = np.zeros(shape, dtype=np.int64)
+    rows = np.zeros(shape + (SHAPE_ROWS,), dtype=np.int64)
+    for t, mino_type in enumerate(MINO_TYPES):
+        for o, orientation in enumerate(ORIENTATIONS):
+            mask = SHAPE_MASKS[(mino_type, orientation)]
+            left[t, o] = mask.left
+            right[t, o] = mask.right
+            bottom[t, o] = mask.bottom
+            top[t, o] = mask.top
+            rows[t, o, :len(mask.rows)] = mask.rows
+    return left, right, bottom, top, rows
+
+
+def build_kick_table(kick_table: KickTable) -> np.ndarray:
+    # Kicks as an array indexed by [type code, orientation, direction (0 for cw, 1 for ccw), kick, (dx, dy)]
+    kicks = np.zeros((len(MINO_TYPES), len(ORIENTATIONS), 2, 5, 2), dtype=np.int64)
+    for t, mino_type in enumerate(MINO_TYPES):
+        for o in range(len(ORIENTATIONS)):
+            for direction, target in enumerate(((o + 1) % 4, (o - 1) % 4)):
+                kicks[t, o, direction] = kick_table.get_kicks(
+                    o, target, mino_type)
+    return kicks
+
+
+SHAPE_LEFT, SHAPE_RIGHT, SHAPE_BOTTOM, SHAPE_TOP, SHAPE_ROW_MASKS = build_shape_tables()
+SPAWN_X = np.array([mn.create_mino(t).center.x for t in MINO_TYPES])
+SPAWN_Y = np.array([mn.create_mino(t).center.y for t in MINO_TYPES])
+# Score of clearing 0-4 lines without a tspin
+LINE_CLEAR_SCORES = np.array(
+    [0] + [LineClear(lines, False).score for lines in range(1, 5)])
+
+
+@dataclass
+class BatchStep:
+    """Result of a BatchGame.step: the lines cleared by each game and where each piece was locked"""
+    lines: np.ndarray
+    types: np.ndarray
+    orientations: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    placed: np.ndarray
+
+    def state(self, i: int) -> PieceState:
+        return PieceState(MINO_TYPES[self.types[i]], ORIENTATIONS[self.orientations[i]],
+                          int(self.x[i]), int(self.y[i]))
+
+
+class BatchGame:
+    """
+    Steps many games in lockstep, one placement per game per step, using array operations over all games.
+    Each board is stored as ROWS + 1 row bitmasks (see Board.row_masks), with the same shape masks, kicks,
+    line clear scores and death rules as Game.
+
+    An action is (hold, orientation, x): optionally hold first, then rotate the spawned mino to the
+    orientation, shift it towards column x until it is blocked, and hard drop it.
+    Since pieces are always hard dropped, line clears are never tspins.
+    """
+
+    def __init__(self, num_games: int, seed: int | None = None, kick_table: KickTable = KickTable()) -> None:
+        self.num_games = num_games
+        self.rng = np.random.default_rng(seed)
+        self.kicks = build_kick_table(kick_table)
+        self.games = np.arange(num_games)
+        self.start()
+
+    def start(self) -> None:
+        n = self.num_games
+        self.boards = np.zeros((n, ROWS + 1), dtype=np.int64)
+        self.alive = np.ones(n, dtype=bool)
+        self.queue = np.zeros((n, 0), dtype=np.int64)
+        self.add_new_bags(2)
+        self.queue_position = np.zeros(n, dtype=np.int64)
+        self.current = self.pop_queue(np.ones(n, dtype=bool))
+        self.held = np.full(n, NO_PIECE, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.pieces_placed = np.zeros(n, dtype=np.int64)
+        # line_clears[i, lines] is the number of times game i cleared that many lines at once
+        self.line_clears = np.zeros((n, 5), dtype=np.int64)
+
+    def add_new_bags(self, num_bags: int) -> None:
+        # Each bag is a random permutation of the seven minos, shuffled independently for every game
+        bags = np.argsort(self.rng.random(
+            (self.num_games, num_bags, BAG_SIZE)), axis=2)
+        self.queue = np.concatenate(
+            [self.queue, bags.reshape(self.num_games, -1)], axis=1)
+
+    def pop_queue(self, games: np.ndarray) -> np.ndarray:
+        # Returns the next piece of every game (only advancing the queue of the selected games)
+        if self.queue_position.max() + PREVIEW_LENGTH + 1 >= self.queue.shape[1]:
+            self.trim_queue()
+            self.add_new_bags(2)
+        pieces = self.queue[self.games, self.queue_position]
+        self.queue_position += games
+        return pieces
+
+    def trim_queue(self) -> None:
+        # Drops the pieces every game still playing has taken, so that the queue does not grow with game length.
+        # Games that ended no longer take pieces, their positions are clamped to the start of the queue
+        consumed = self.queue_position[self.alive].min() if self.alive.any() else self.queue_position.max()
+        self.queue = self.queue[:, consumed:]
+        self.queue_position = np.maximum(self.queue_position - consumed, 0)
+
+    def fits(self, t: np.ndarray, o: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Vectorised Board.fits, checks the mino of each game against its own board"""
+        left = x + SHAPE_LEFT[t, o]
+        bottom = y + SHAPE_BOTTOM[t, o]
+        valid = (left >= 0) & (x + SHAPE_RIGHT[t, o] < COLUMNS) & \
+            (bottom >= 0) & (y + SHAPE_TOP[t, o] <= ROWS)
+        shift = np.where(valid, left, 0)
+        for r in range(SHAPE_ROWS):
+            row = np.clip(bottom + r, 0, ROWS)
+            blocks = SHAPE_ROW_MASKS[t, o, r] << shift
+            valid &= (self.boards[self.games, row] & blocks) == 0
+        return valid
+
+    def step(self, actions: np.ndarray) -> BatchStep:
+        """
+        Performs one placement in every game that is still alive.
+        actions is an integer array of shape (num_games, 3) of (hold, orientation, x).
+        """
+        active = self.alive.copy()
+        hold = (actions[:, 0] != 0) & active
+        self.hold(hold)
+
+        t = self.current
+        o = np.zeros(self.num_games, dtype=np.int64)
+        x = SPAWN_X[t]
+        y = SPAWN_Y[t]
+        o, x, y = self.rotate(t, o, x, y, actions[:, 1] % 4, active)
+        x = self.shift(t, o, x, y, actions[:, 2], active)
+        y = self.drop(t, o, x, y, active)
+
+        self.lock(t, o, x, y, active)
+        self.pieces_placed += active
+        self.current = np.where(active, self.pop_queue(active), self.current)
+        lines = self.clear_lines(active)
+        self.score += LINE_CLEAR_SCORES[lines]
+        self.line_clears[self.games, lines] += active & (lines > 0)
+        self.check_death(active)
+        return BatchStep(lines, t, o, x, y, active)
+
+    def hold(self, hold: np.ndarray) -> None:
+        # Same as Game.hold_mino: the first hold takes the next piece from the queue, later holds swap
+        first_hold = hold & (self.held == NO_PIECE)
+        next_pieces = self.pop_queue(first_hold)
+        held = self.held
+        self.held = np.where(hold, self.current, held)
+        self.current = np.where(first_hold, next_pieces,
+                                np.where(hold, held, self.current))
+
+    def rotate(self, t, o, x, y, target, active):
+        # Rotates from the spawn orientation to the target orientation in a single rotation,
+        # trying each kick in sequence until the first valid kick is found
+        rotated_o = target
+        rotated_x = x.copy()
+        rotated_y = y.copy()
+        rotated = np.zeros(self.num_games, dtype=bool)
+        # 180 degree rotations do not kick
+        is_180 = active & (target == 2)
+        rotated |= is_180 & self.fits(t, rotated_o, x, y)
+        for direction, needed in ((0, target == 1), (1, target == 3)):
+            needed = needed & active
+            for k in range(5):
+                kick = self.kicks[t, o, direction, k]
+                kx = x + kick[:, 0]
+                ky = y + kick[:, 1]
+                success = needed & ~rotated & self.fits(t, rotated_o, kx, ky)
+                rotated_x = np.where(success, kx, rotated_x)
+                rotated_y = np.where(success, ky, rotated_y)
+                rotated |= success
+        return np.where(rotated, rotated_o, o), np.where(rotated, rotated_x, x), np.where(rotated, rotated_y, y)
+
+    def shift(self, t, o, x, y, target_x, active):
+        # Moves one column at a time towards the target column, stopping once blocked
+        for _ in range(COLUMNS):
+            direction = np.sign(target_x - x) * active
+            if not direction.any():
+                break
+            moved = (direction != 0) & self.fits(t, o, x + direction, y)
+            x = np.where(moved, x + direction, x)
+        return x
+
+    def drop(self, t, o, x, y, active):
+        # Moves down until no longer possible
+        falling = active.copy()
+        while falling.any():
+            falling &= self.fits(t, o, x, y - 1)
+            y = y - falling
+        return y
+
+    def lock(self, t, o, x, y, active) -> None:
+        bottom = y + SHAPE_BOTTOM[t, o]
+        shift = x + SHAPE_LEFT[t, o]
+        for r in range(SHAPE_ROWS):
+            blocks = SHAPE_ROW_MASKS[t, o, r] * active
+            rows = np.where(blocks != 0, bottom + r, 0)
+            self.boards[self.games, rows] |= blocks << shift
+
+    def clear_lines(self, active) -> np.ndarray:
+        filled = (self.boards == FULL_ROW) & active[:, None]
+        lines = filled.sum(axis=1)
+        if lines.any():
+            # Stable sort moves the filled rows to the top while keeping the order of the remaining rows,
+            # then the filled rows are emptied
+            order = np.argsort(filled, axis=1, kind='stable')
+            self.boards = np.take_along_axis(self.boards, order, axis=1)
+            row_numbers = np.arange(ROWS + 1)
+            self.boards[row_numbers >= ROWS + 1 - lines[:, None]] = 0
+        return lines
+
+    def check_death(self, active) -> None:
+        # Same as Game.check_death: dies if the new mino cannot spawn or if there are blocks in the 21st row
+        t = self.current
+        spawn_blocked = ~self.fits(t, np.zeros_like(t), SPAWN_X[t], SPAWN_Y[t])
+        exceeds = self.boards[:, ROWS] != 0
+        self.alive &= ~(active & (spawn_blocked | exceeds))
+
+    def random_actions(self) -> np.ndarray:
+        return np.stack([
+            self.rng.random(self.num_games) < 0.1,
+            self.rng.integers(0, 4, self.num_games),
+            self.rng.integers(0, COLUMNS, self.num_games)
+        ], axis=1).astype(np.int64)
+
+
+class SequenceQueue(PieceQueue):
+    """PieceQueue that gives out a fixed sequence of mino types, used to replay a BatchGame with Game"""
+
+    def __init__(self, types: list[str]) -> None:
+        self.sequence = iter(types)
+        super().__init__()
+
+    def add_new_bag(self) -> None:
+        for _ in range(BAG_SIZE):
+            self.queue.append(TYPE_CODES[next(self.sequence)])
+
+
+def check_equivalence(num_games: int = 100, steps: int = 200, seed: int = 0) -> None:
+    """
+    Plays random actions with a BatchGame, places the same pieces in a Game for each of its games
+    and checks that the boards, scores and deaths match.
+    Raises an AssertionError on the first difference found.
+    """
+    # Imported here since Game is only needed for checking
+    from game import Game
+
+    batch = BatchGame(num_games, seed)
+    # Make sure the queue already holds every piece that will be used
+    batch.add_new_bags(2 * steps // BAG_SIZE + 2)
+    games = []
+    for i in range(num_games):
+        game = Game()
+        game.start()
+        game.queue = SequenceQueue([MINO_TYPES[t] for t in batch.queue[i]])
+        game.current_mino = game.queue.pop()
+        games.append(game)
+
+    for step_number in range(steps):
+        actions = batch.random_actions()
+        result = batch.step(actions)
+        for i, game in enumerate(games):
+            if not result.placed[i]:
+                continue
+            game.place(result.state(i), hold=bool(actions[i, 0]))
+            assert game.board.row_masks == batch.boards[i].tolist(), \
+                f'Board of game {i} differs after step {step_number}'
+            assert game.current_score == batch.score[i], \
+                f'Score of game {i} differs after step {step_number}'
+            assert game.alive == batch.alive[i], \
+                f'Game {i} death differs after step {step_number}'
+        if not batch.alive.any():
+            break
+
+
+def test():
+    check_equivalence()
+
+    # The queue stays bounded however many pieces are taken, also when some games have ended
+    batch = BatchGame(8, seed=0)
+    batch.alive[0] = False
+    everyone = np.ones(batch.num_games, dtype=bool)
+    pieces = [batch.current] + [batch.pop_queue(batch.alive) for _ in range(10000)]
+    assert batch.queue.shape[1] <= 4 * BAG_SIZE
+    # Every bag of the games still playing holds each piece once
+    bags = np.stack(pieces, axis=1)[1:, :10000 // BAG_SIZE * BAG_SIZE].reshape(7, -1, BAG_SIZE)
+    assert (np.sort(bags, axis=2) == np.arange(BAG_SIZE)).all()
+    assert batch.pop_queue(everyone).shape == (batch.num_games,)
+    print('BatchGame matches Game')
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,296 @@
+"""
+Lookahead bot: beam search over the placements of the current piece, the held piece and the preview queue.
+
+Each layer of the search places one more piece. Every node of the beam is expanded into all placements of
+its next piece (and of the piece obtained by holding), the resulting boards of the whole layer are evaluated
+at once (see evaluation.lock_and_evaluate), and the best width distinct positions are kept for the next layer.
+A node's value is the weighted placement features (landing height, lines and line clear score, including
+tspins) summed along its path, plus the weighted board features of its board. The bot plays the first
+placement on the path of the best node of the deepest layer completed within the time budget.
+Move generation takes most of the time, so the placements of each board and piece are kept in a transposition
+table: the boards searched for one decision are mostly searched again for the next one.
+
+Requires NumPy (pip install numpy).
+
+Usage: python beamsearch.py --games 4 --width 16 --depth 3 --budget-ms 50
+"""
+import argparse
+import time
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+import board as bd
+import mino as mn
+from evaluation import DEFAULT_WEIGHTS, PLACEMENT_FEATURES, Weights, board_cells, column_heights, lock_and_evaluate
+from game import Game
+from movegen import MoveGenerator, Placement
+from piecequeue import PREVIEW_LENGTH
+from zobrist import CURRENT_TYPE_KEYS, HOLD_KEYS, TranspositionTable
+
+# The default weights, with tspins and multiple line clears worth setting up
+BEAM_WEIGHTS = replace(DEFAULT_WEIGHTS, line_clear_score=0.3)
+CELL_KEY_ARRAY = np.array(bd.CELL_KEYS, dtype=np.uint64)
+SPAWN_STATES = {mino_type: mn.create_mino(mino_type).state for mino_type in mn.MINO_TYPES}
+
+
+@dataclass(slots=True)
+class SearchBoard:
+    # The parts of a Board used by MoveGenerator, for boards that only exist during the search
+    row_masks: list[int]
+    column_heights: list[int]
+    hash: int
+
+
+@dataclass(slots=True)
+class Node:
+    board: SearchBoard
+    row_masks: np.ndarray
+    held: str | None
+    # Index into the piece sequence of the next piece to place
+    next_index: int
+    # Weighted placement features along the path, and those plus the weighted features of the board
+    reward: float
+    value: float
+    # First placement on the path from the root, and whether it holds first
+    action: tuple[Placement, bool]
+
+
+@dataclass
+class SearchStats:
+    decisions: int = 0
+    # Placements evaluated, over all layers of all decisions
+    nodes: int = 0
+    seconds: float = 0
+    # Sum of the depth of the deepest completed layer of each decision
+    depths: int = 0
+    # Decisions cut short by the time budget
+    timeouts: int = 0
+
+    @property
+    def decisions_per_second(self) -> float:
+        return self.decisions / self.seconds if self.seconds else 0
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.seconds if self.seconds else 0
+
+    @property
+    def mean_depth(self) -> float:
+        return self.depths / self.decisions if self.decisions else 0
+
+
+def board_hashes(boards: np.ndarray) -> np.ndarray:
+    # Vectorised zobrist.rows_hash of a (count, ROWS + 1) array of row masks, equal to Board.hash
+    keys = np.where(board_cells(boards), CELL_KEY_ARRAY, np.uint64(0))
+    return np.bitwise_xor.reduce(keys.reshape(len(boards), -1), axis=1)
+
+
+def piece_choices(sequence: list[str], held: str | None, next_index: int,
+                  allow_hold: bool) -> list[tuple[str, str | None, int, bool]]:
+    """
+    The pieces that can be placed next, each with the held piece and the index of the next piece afterwards,
+    and whether it is obtained by holding
+    """
+    if next_index >= len(sequence):
+        return []
+    current = sequence[next_index]
+    choices = [(current, held, next_index + 1, False)]
+    if allow_hold and current != held:
+        if held is not None:
+            choices.append((held, current, next_index + 1, True))
+        elif next_index + 1 < len(sequence):
+            choices.append((sequence[next_index + 1], current, next_index + 2, True))
+    return choices
+
+
+class BeamSearchPolicy:
+    """
+    Chooses placements with a beam search of the given width, looking depth pieces ahead (at most the
+    current piece and the preview), within budget_ms milliseconds per decision if set.
+    Can be used wherever a runner.Policy is expected. Meant for games played with Game.place, where the
+    current mino is always at its spawn position and holding is allowed again after every placement.
+    """
+
+    def __init__(self, width: int = 16, depth: int = 3, budget_ms: float | None = None,
+                 weights: Weights = BEAM_WEIGHTS, use_hold: bool = True, table_bits: int = 14) -> None:
+        if width < 1 or depth < 1:
+            raise ValueError('The beam width and depth must be at least 1')
+        self.width = width
+        self.depth = depth
+        self.budget_ms = budget_ms
+        self.weights = weights.to_array()
+        self.use_hold = use_hold
+        self.move_generator = MoveGenerator()
+        self.placements = TranspositionTable(table_bits)
+        self.stats = SearchStats()
+
+    def __call__(self, game: Game) -> tuple[Placement, bool]:
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000 if self.budget_ms is not None else None
+        sequence = [game.current_mino.type] + game.queue.peek_types(PREVIEW_LENGTH)
+        held = game.hold.held_mino.type if game.hold.held_mino is not None else None
+        self.placements.new_search()
+        root = Node(SearchBoard(game.board.row_masks, game.board.column_heights, game.board.hash),
+                    np.array(game.board.row_masks, dtype=np.int64), held, 0, 0, 0, None)
+
+        beam = [root]
+        best = None
+        depth = 0
+        timed_out = False
+        while depth < self.depth:
+            layer = self.expand(beam, sequence, depth == 0 and not game.hold.allow_hold, deadline)
+            if layer is None:
+                timed_out = True
+                break
+            if not layer:
+                break
+            beam = layer
+            best = beam[0].action
+            depth += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                timed_out = depth < self.depth
+                break
+
+        if best is None:
+            # Every placement ends the game
+            best = next(((placements[0], hold) for hold in (False, True)
+                         if (placements := game.get_placements(hold))), None)
+        stats = self.stats
+        stats.decisions += 1
+        stats.seconds += time.perf_counter() - start
+        stats.depths += depth
+        stats.timeouts += timed_out
+        return best
+
+    def expand(self, beam: list[Node], sequence: list[str], hold_disabled: bool,
+               deadline: float | None) -> list[Node] | None:
+        """
+        Returns the best distinct children of the nodes of the beam, best first, or None if the deadline
+        passed before every node was expanded. The first layer is always completed.
+        """
+        parents = []
+        states = []
+        tspins = []
+        children = []
+        for i, node in enumerate(beam):
+            for piece, held, next_index, hold in piece_choices(sequence, node.held, node.next_index,
+                                                               self.use_hold and not hold_disabled):
+                for placement in self.generate_placements(node.board, piece):
+                    parents.append(i)
+                    states.append(placement.state)
+                    tspins.append(placement.tspin)
+                    children.append((held, next_index, node.action or (placement, hold)))
+            if deadline is not None and node.action is not None and time.perf_counter() >= deadline:
+                return None
+        self.stats.nodes += len(states)
+        if not states:
+            return []
+
+        parents = np.array(parents)
+        boards, features, dead = lock_and_evaluate(
+            np.stack([node.row_masks for node in beam])[parents], states, tspins)
+        rewards = np.array([node.reward for node in beam])[parents] + \
+            features[:, :PLACEMENT_FEATURES] @ self.weights[:PLACEMENT_FEATURES]
+        values = rewards + features[:, PLACEMENT_FEATURES:] @ self.weights[PLACEMENT_FEATURES:]
+        values[dead] = -np.inf
+        hashes = board_hashes(boards).tolist()
+
+        # Positions reached more than once (by different paths or holds) are only kept once, with their best value
+        kept = []
+        seen = set()
+        for i in np.argsort(-values, kind='stable'):
+            if len(kept) == self.width or dead[i]:
+                break
+            held, next_index, _ = children[i]
+            key = (hashes[i] ^ (HOLD_KEYS[held] if held is not None else 0), next_index)
+            if key not in seen:
+                seen.add(key)
+                kept.append(i)
+        if not kept:
+            return []
+
+        heights = column_heights(boards[kept]).tolist()
+        return [Node(SearchBoard(boards[i].tolist(), node_heights, hashes[i]), boards[i], *children[i][:2],
+                     rewards[i], values[i], children[i][2]) for i, node_heights in zip(kept, heights)]
+
+    def generate_placements(self, board: SearchBoard, piece: str) -> list[Placement]:
+        key = board.hash ^ CURRENT_TYPE_KEYS[piece]
+        placements = self.placements.lookup(key)
+        if placements is None:
+            placements = self.move_generator.generate_placements(board, SPAWN_STATES[piece])
+            self.placements.store(key, placements)
+        return placements
+
+
+def play(seed: int, policy: BeamSearchPolicy, max_pieces: int) -> Game:
+    game = Game(seed=seed)
+    game.start()
+    while game.alive and game.pieces_placed < max_pieces:
+        placement, hold = policy(game)
+        game.place(placement.state, hold, placement.last_move)
+    return game
+
+
+def test():
+    from evaluation import HeuristicPolicy
+
+    # Looking a single piece ahead plays exactly like the heuristic policy with the same weights
+    game = Game(seed=3)
+    game.start()
+    heuristic = HeuristicPolicy(BEAM_WEIGHTS)
+    beam = BeamSearchPolicy(width=4, depth=1)
+    for _ in range(60):
+        placement, hold = beam(game)
+        assert (placement, hold) == heuristic(game)
+        game.place(placement.state, hold, placement.last_move)
+
+    # Vectorised hashes match the incremental board hash
+    boards = np.array([game.board.row_masks, [0] * (bd.ROWS + 1)], dtype=np.int64)
+    assert board_hashes(boards).tolist() == [game.board.hash, 0]
+
+    # Holding with nothing held uses up the next piece, holding the same piece is pointless
+    assert piece_choices(['T', 'I'], None, 0, True) == [('T', None, 1, False), ('I', 'T', 2, True)]
+    assert piece_choices(['T', 'I'], None, 1, True) == [('I', None, 2, False)]
+    assert piece_choices(['T', 'I'], 'T', 0, True) == [('T', 'T', 1, False)]
+
+    # Deeper searches survive and clear lines, and the budget cuts searches short
+    policy = BeamSearchPolicy(width=8, depth=3)
+    game = play(1, policy, 100)
+    assert game.alive and sum(game.line_clears.values()) > 20
+    assert policy.stats.decisions == 100 and policy.stats.mean_depth == 3 and policy.stats.timeouts == 0
+    policy = BeamSearchPolicy(width=64, depth=6, budget_ms=1)
+    game = play(2, policy, 20)
+    assert policy.stats.timeouts == policy.stats.decisions == 20 and 1 <= policy.stats.mean_depth < 6
+    print('beam search tests passed')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play seeded games with the beam search bot')
+    parser.add_argument('--games', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--width', type=int, default=16)
+    parser.add_argument('--depth', type=int, default=3,
+                        help=f'pieces to look ahead, at most {PREVIEW_LENGTH + 1}')
+    parser.add_argument('--budget-ms', type=float, help='time budget per decision in milliseconds')
+    parser.add_argument('--max-pieces', type=int, default=500)
+    parser.add_argument('--no-hold', action='store_true')
+    parser.add_argument('--test', action='store_true', help='run the tests instead')
+    args = parser.parse_args()
+
+    if args.test:
+        test()
+        return
+    policy = BeamSearchPolicy(args.width, args.depth, args.budget_ms, use_hold=not args.no_hold)
+    for seed in range(args.seed, args.seed + args.games):
+        game = play(seed, policy, args.max_pieces)
+        print(f'Game {seed}: score {game.score}, {game.pieces_placed} pieces, '
+              f'{sum(game.line_clears.values())} line clears{"" if game.alive else " (died)"}')
+    stats = policy.stats
+    print(f'{stats.decisions} decisions in {stats.seconds:.2f}s: {stats.decisions_per_second:.1f} decisions/s, '
+          f'{stats.nodes_per_second:.0f} nodes/s, mean depth {stats.mean_depth:.2f}, {stats.timeouts} timeouts, '
+          f'{policy.placements.hit_rate:.0%} placement cache hits')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""
+Benchmarks of the hot paths on representative boards, and of whole game throughput.
+Results can be saved as a JSON baseline, and compared against one to find regressions.
+
+Usage: python benchmark.py [--filter hard_drop] [--save baseline.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable
+
+import board as bd
+import mino as mn
+import zobrist
+from board import Board, BoardManager
+from game import Game
+from headless import random_input, run_frames
+from movetype import MoveType
+from piecemovement import PieceMovement, is_valid_position
+from position import Position
+
+FIXTURE_SEED = 1234
+# Number of filled rows of each fixture board. Every filled row has a few holes, so that no row is full
+FIXTURES = {
+    'empty': 0,
+    'messy': 8,
+    'near_top': 16
+}
+COLOURS = [mn.create_mino(mino_type).colour for mino_type in mn.MINO_TYPES]
+
+# A benchmark is created from a fixture board and returns the operation to time
+Benchmark = Callable[[Board], Callable[[], None]]
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def register_benchmark(name: str):
+    def decorator(benchmark: Benchmark):
+        BENCHMARKS[name] = benchmark
+        return benchmark
+    return decorator
+
+
+@dataclass
+class Result:
+    value: float
+    unit: str
+    higher_is_better: bool
+
+
+def fixture_board(name: str) -> Board:
+    """Returns a board with the fixture's number of rows filled with random cells and holes"""
+    rng = random.Random(FIXTURE_SEED)
+    board = Board()
+    for y in range(FIXTURES[name]):
+        holes = rng.sample(range(bd.COLUMNS), rng.randint(1, 3))
+        for x in range(bd.COLUMNS):
+            if x not in holes:
+                board.set_cell_colour(Position(x, y), rng.choice(COLOURS))
+    return board
+
+
+@register_benchmark('mino_blocks')
+def bench_mino_blocks(board: Board) -> Callable[[], None]:
+    mino = mn.create_mino('T')
+    return lambda: mino.blocks
+
+
+@register_benchmark('is_valid_position')
+def bench_is_valid_position(board: Board) -> Callable[[], None]:
+    mino = mn.create_mino('T')
+    return lambda: is_valid_position(mino, board)
+
+
+@register_benchmark('hard_drop')
+def bench_hard_drop(board: Board) -> Callable[[], None]:
+    # Drops from the spawn position, moving the mino back up every time
+    move_handler = PieceMovement()
+    mino = mn.create_mino('T')
+    spawn = mino.state
+
+    def run():
+        move_handler.hard_drop(mino, board)
+        mino.set_state(spawn)
+    return run
+
+
+@register_benchmark('rotate_with_kicks')
+def bench_rotate_with_kicks(board: Board) -> Callable[[], None]:
+    # Rotates a mino resting on the stack, where rotations are most likely to kick
+    move_handler = PieceMovement()
+    mino = mn.create_mino('T')
+    move_handler.hard_drop(mino, board)
+    resting = mino.state
+
+    def run():
+        move_handler.rotate_with_kicks(mino, board, 'cw')
+        mino.set_state(resting)
+    return run
+
+
+@register_benchmark('find_and_clear_lines')
+def bench_find_and_clear_lines(board: Board) -> Callable[[], None]:
+    # Clears two lines filled on top of the fixture, restoring the board every time
+    manager = BoardManager(board)
+    top = max(board.column_heights)
+    for y in (top, top + 1):
+        for x in range(bd.COLUMNS):
+            board.set_cell_colour(Position(x, y), COLOURS[0])
+    board_arr = list(board.board_arr)
+    row_masks = list(board.row_masks)
+    column_heights = list(board.column_heights)
+    board_hash = board.hash
+    mino = mn.create_mino('I')
+
+    def run():
+        board.board_arr = list(board_arr)
+        board.row_masks = list(row_masks)
+        board.column_heights = list(column_heights)
+        board.hash = board_hash
+        manager.locked_rows.update((top, top + 1))
+        manager.find_and_clear_lines(mino, MoveType.DOWN)
+    return run
+
+
+def fixture_game(board: Board) -> Game:
+    game = Game(gravity=5, seed=FIXTURE_SEED)
+    game.start()
+    # The hash is recomputed in case the board's cells were set without keeping it up to date
+    board.hash = zobrist.rows_hash(bd.CELL_KEYS, board.row_masks)
+    game.board = board
+    game.board_manager = BoardManager(board)
+    return game
+
+
+@register_benchmark('game_update')
+def bench_game_update(board: Board) -> Callable[[], None]:
+    # One frame with random input, restarting on the fixture board whenever the game ends
+    game = fixture_game(board)
+    start = game.snapshot()
+    next_input = random_input(FIXTURE_SEED)
+    frame = 0
+
+    def run():
+        nonlocal frame
+        if not game.alive:
+            game.restore(start)
+        game.update(next_input(game, frame))
+        frame += 1
+    return run
+
+
+@register_benchmark('view_render_game')
+def bench_view_render_game(board: Board) -> Callable[[], None] | None:
+    view = create_view('View')
+    if view is None:
+        return None
+    game = fixture_game(board)
+    return lambda: view.render_game(game)
+
+
+@register_benchmark('dirty_rect_view_render_game')
+def bench_dirty_rect_view_render_game(board: Board) -> Callable[[], None] | None:
+    # Renders after the mino moved one column, as happens when the player moves it
+    view = create_view('DirtyRectView')
+    if view is None:
+        return None
+    game = fixture_game(board)
+    move_handler = PieceMovement()
+    moves = [move_handler.move_left, move_handler.move_right]
+    frame = 0
+
+    def run():
+        nonlocal frame
+        moves[frame % 2](game.current_mino, game.board)
+        view.render_game(game)
+        frame += 1
+    return run
+
+
+def create_view(name: str):
+    # Imported here so that the other benchmarks do not require pygame.
+    # Without a display, pygame renders to an offscreen surface
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    try:
+        import view
+    except ImportError:
+        return None
+    return getattr(view, name)()
+
+
+def time_operation(operation: Callable[[], None], min_seconds: float, repeats: int) -> float:
+    """Returns the fastest time per call in nanoseconds over repeats runs of at least min_seconds each"""
+    # Number of calls per run, doubled until a run takes long enough
+    number = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            operation()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_seconds * 1e9:
+            break
+        number *= 2
+
+    best = elapsed / number
+    for _ in range(repeats - 1):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            operation()
+        best = min(best, (time.perf_counter_ns() - start) / number)
+    return best
+
+
+def run_micro(name_filter: str = '', min_seconds: float = 0.1, repeats: int = 5) -> dict[str, Result]:
+    results = {}
+    for name, benchmark in BENCHMARKS.items():
+        for fixture in FIXTURES:
+            key = f'{name}[{fixture}]'
+            if name_filter not in key:
+                continue
+            operation = benchmark(fixture_board(fixture))
+            if operation is None:
+                print(f'{key}: skipped (pygame is not installed)')
+                continue
+            results[key] = Result(time_operation(
+                operation, min_seconds, repeats), 'ns/op', False)
+            print(f'{key}: {results[key].value:.0f} ns/op')
+    return results
+
+
+def run_macro(name_filter: str = '', frames: int = 20000) -> dict[str, Result]:
+    # Whole games with random input, restarted whenever they end
+    results = {}
+    if not any(name_filter in key for key in ('headless_frames', 'headless_pieces')):
+        return results
+    stats = run_frames(Game(gravity=5, seed=FIXTURE_SEED),
+                       frames, random_input(FIXTURE_SEED))
+    results['headless_frames'] = Result(stats.frames_per_second, 'frames/s', True)
+    results['headless_pieces'] = Result(stats.pieces_per_second, 'pieces/s', True)
+    for key, result in results.items():
+        print(f'{key}: {result.value:.0f} {result.unit}')
+    return results
+
+
+def save(results: dict[str, Result], path: str) -> None:
+    data = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': {key: asdict(result) for key, result in results.items()}
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def load(path: str) -> dict[str, Result]:
+    with open(path) as f:
+        data = json.load(f)
+    return {key: Result(**result) for key, result in data['results'].items()}
+
+
+def compare(results: dict[str, Result], baseline: dict[str, Result], threshold: float) -> list[str]:
+    """
+    Prints the change of every result relative to the baseline, and returns the names of those
+    that got worse by more than threshold (eg. 0.1 for 10%)
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key].value
+        if base == 0:
+            # No relative change can be computed from a zero baseline
+            print(f'{key}: {base:.0f} -> {result.value:.0f} {result.unit} (n/a)')
+            continue
+        # Positive when the result got worse
+        change = (base - result.value) / base if result.higher_is_better else (result.value - base) / base
+        regressed = change > threshold
+        if regressed:
+            regressions.append(key)
+        print(f'{key}: {base:.0f} -> {result.value:.0f} {result.unit} '
+              f'({-change:+.1%}){" REGRESSION" if regressed else ""}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark TetrisPy')
+    parser.add_argument('--filter', default='',
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('--save', metavar='PATH',
+                        help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH',
+                        help='compare the results against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fraction by which a result has to get worse to count as a regression')
+    parser.add_argument('--quick', action='store_true',
+                        help='shorter runs, for a rough idea only')
+    args = parser.parse_args()
+
+    min_seconds, repeats, frames = (0.02, 3, 5000) if args.quick else (0.1, 5, 20000)
+    results = run_micro(args.filter, min_seconds, repeats)
+    results.update(run_macro(args.filter, frames))
+    if args.save:
+        save(results, args.save)
+    if args.compare:
+        print()
+        regressions = compare(results, load(args.compare), args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regression(s) beyond {args.threshold:.0%}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,57 @@
+from dataclasses import dataclass
+
+import mino as mn
+import zobrist
 from position import Position
 from lineclear import LineClear
-from mino import Mino
+from mino import Mino, Orientation
 from movetype import MoveType
 
 ROWS = 20
 COLUMNS = 10
 EMPTY = 'grey'
 EMPTY_ROW = [EMPTY for x in range(COLUMNS)]
+FULL_ROW = (1 << COLUMNS) - 1
+# Colour of cells that were not placed by a mino (see Board.from_row_masks)
+FILLER_COLOUR = (128, 128, 128)
+# Colours a cell can have, numbered for Board.pack
+CELL_COLOURS = [EMPTY, FILLER_COLOUR] + [mn.create_mino(mino_type).colour for mino_type in mn.MINO_TYPES]
+CELL_CODES = {colour: code for code, colour in enumerate(CELL_COLOURS)}
+# Zobrist key of each cell, indexed by [y][x] (see zobrist.py)
+CELL_KEYS = zobrist.cell_keys(ROWS + 1, COLUMNS)
+
+
+@dataclass(frozen=True)
+class ShapeMask:
+    """
+    Occupancy of a mino in a given orientation, stored as one bitmask per row.
+    left/right/bottom/top are the extents of the blocks relative to the mino's center,
+    rows[i] holds the blocks of row (bottom + i), with bit 0 corresponding to column (left).
+    column_bottoms holds (dx, dy) of the lowest block in each column the mino covers.
+    """
+    left: int
+    right: int
+    bottom: int
+    top: int
+    rows: tuple[int, ...]
+    column_bottoms: tuple[tuple[int, int], ...]
+
+
+def build_shape_mask(offsets: list[tuple[int, int]]) -> ShapeMask:
+    left = min(dx for dx, _ in offsets)
+    right = max(dx for dx, _ in offsets)
+    bottom = min(dy for _, dy in offsets)
+    top = max(dy for _, dy in offsets)
+    rows = [0] * (top - bottom + 1)
+    column_bottoms = {}
+    for dx, dy in offsets:
+        rows[dy - bottom] |= 1 << (dx - left)
+        column_bottoms[dx] = min(dy, column_bottoms.get(dx, dy))
+    return ShapeMask(left, right, bottom, top, tuple(rows), tuple(sorted(column_bottoms.items())))
+
+
+SHAPE_MASKS = {key: build_shape_mask(offsets)
+               for key, offsets in mn.SHAPES.items()}
 
 
 class Board:
@@ -14,11 +59,51 @@ class Board:
     Class that holds board state in a 10 by 20 array.
     (0,0) denotes the bottom left corner, (10,20) denotes the top right corner.
     The elements in the array represents the colour of the corresponding cell.
+    Occupancy is additionally kept in row_masks, one integer per row with bit x set
+    if column x of that row is occupied, which is used for all collision checks.
+    The surface of the stack is cached in column_heights (number of rows up to and including
+    the highest block of each column).
+    hash is the Zobrist hash of the occupied cells, kept up to date as cells are set and lines are cleared.
     """
 
     def __init__(self) -> None:
         self.board_arr = list()
         init_board(self.board_arr)
+        self.row_masks: list[int] = [0] * (ROWS + 1)
+        self.column_heights: list[int] = [0] * COLUMNS
+        self.hash = 0
+
+    @classmethod
+    def from_row_masks(cls, row_masks: list[int], colour=FILLER_COLOUR) -> 'Board':
+        """Creates a board with the cells set in row_masks (row 0 at the bottom) filled with colour"""
+        board = cls()
+        for y, row_mask in enumerate(row_masks):
+            for x in range(COLUMNS):
+                if (row_mask >> x) & 1:
+                    board.board_arr[y][x] = colour
+            board.row_masks[y] = row_mask
+        board.update_columns()
+        board.hash = zobrist.rows_hash(CELL_KEYS, board.row_masks)
+        return board
+
+    def pack(self) -> bytes:
+        """The colour of every cell as its index into CELL_COLOURS, row by row from the bottom"""
+        try:
+            return bytes([CELL_CODES[colour] for row in self.board_arr for colour in row])
+        except KeyError as e:
+            raise ValueError(f'Cannot pack cell colour {e.args[0]}')
+
+    @classmethod
+    def unpack(cls, cells: bytes, row_masks: tuple[int, ...], column_heights: tuple[int, ...],
+               hash: int) -> 'Board':
+        """Creates a board from the output of pack and the rest of its state, which pack leaves out"""
+        board = cls.__new__(cls)
+        board.board_arr = [[CELL_COLOURS[code] for code in cells[y * COLUMNS:(y + 1) * COLUMNS]]
+                           for y in range(ROWS + 1)]
+        board.row_masks = list(row_masks)
+        board.column_heights = list(column_heights)
+        board.hash = hash
+        return board
 
     def __str__(self) -> str:
         divider = '-' * 82
@@ -44,6 +129,14 @@ class Board:
         except IndexError:
             raise ValueError(
                 f'Cell should be within (0,0) -> ({ROWS-1},{COLUMNS-1})')
+        row_mask = self.row_masks[cell.y]
+        if is_empty(colour):
+            self.row_masks[cell.y] &= ~(1 << cell.x)
+        else:
+            self.row_masks[cell.y] |= 1 << cell.x
+        if self.row_masks[cell.y] != row_mask:
+            self.hash ^= CELL_KEYS[cell.y][cell.x]
+        self.update_column(cell.x)
 
     def get_cell_colour(self, cell: Position) -> None:
         try:
@@ -53,22 +146,67 @@ class Board:
                 f'Cell should be within (0,0) -> ({ROWS-1},{COLUMNS-1})')
 
     def is_cell_occupied(self, cell: Position) -> bool:
-        if not 0 <= cell.x < self.columns or not 0 <= cell.y < self.rows + 1:
+        if not 0 <= cell.x < COLUMNS or not 0 <= cell.y < ROWS + 1:
             return False
-        return not is_empty(self.get_cell_colour(cell))
+        return (self.row_masks[cell.y] >> cell.x) & 1 == 1
+
+    def fits(self, mino_type: str, orientation: Orientation, x: int, y: int) -> bool:
+        """Checks if a mino with its center at (x, y) is within the board and not overlapping any block"""
+        return shape_fits(self.row_masks, SHAPE_MASKS[(mino_type, orientation)], x, y)
+
+    def drop_distance(self, mino_type: str, orientation: Orientation, x: int, y: int) -> int:
+        """Number of rows a mino with its center at (x, y) can move down before landing"""
+        shape = SHAPE_MASKS[(mino_type, orientation)]
+        # If the mino is above the stack in every column it covers, it lands on whichever column
+        # has the smallest gap between the mino's lowest block and the column's height
+        distance = ROWS + 1
+        for dx, dy in shape.column_bottoms:
+            gap = y + dy - self.column_heights[x + dx]
+            if gap < 0:
+                break
+            distance = min(distance, gap)
+        else:
+            return distance
+
+        # Otherwise the mino is tucked under an overhang, so step down until it no longer fits
+        distance = 0
+        while shape_fits(self.row_masks, shape, x, y - distance - 1):
+            distance += 1
+        return distance
+
+    def update_column(self, column: int) -> None:
+        # Recompute the cached height of a single column, from its highest block down
+        bit = 1 << column
+        row_masks = self.row_masks
+        for y in range(len(row_masks) - 1, -1, -1):
+            if row_masks[y] & bit:
+                self.column_heights[column] = y + 1
+                return
+        self.column_heights[column] = 0
+
+    def update_columns(self) -> None:
+        for column in range(COLUMNS):
+            self.update_column(column)
 
 
 class BoardManager:
     """
     Class to manage higher level board operations such as finding cleared lines and
     performing line clears.
+    Rows covered by minos added since the last line clear check are tracked in locked_rows,
+    since only those rows can have become filled.
     """
 
     def __init__(self, board: Board) -> None:
         self.board = board
+        self.locked_rows: set[int] = set()
 
     def find_and_clear_lines(self, mino: Mino, previous_move: MoveType) -> LineClear | None:
-        filled_lines = self.find_filled_lines()
+        if not self.locked_rows:
+            # Nothing was locked since the last check, so no new lines can be filled
+            return None
+        filled_lines = self.find_filled_lines(self.locked_rows)
+        self.locked_rows.clear()
         if filled_lines:
             tspin = self.detect_tspin(mino, previous_move)
             num_lines_cleared = len(filled_lines)
@@ -97,36 +235,57 @@ class BoardManager:
                 occupied_corners += 1
         return occupied_corners >= 3
 
-    def find_filled_lines(self) -> list[int]:
+    def find_filled_lines(self, rows: set[int] | None = None) -> list[int]:
+        # Checks the given rows, or the entire board if no rows are given
+        if rows is None:
+            rows = range(len(self.board.row_masks))
         cleared_lines = []
-        for i, row in enumerate(self.board.board_arr):
-            if is_row_filled(row):
+        for i in sorted(rows):
+            if self.board.row_masks[i] == FULL_ROW:
                 cleared_lines.append(i)
         return cleared_lines
 
     def clear_lines(self, lines: list[int]) -> None:
+        # Every row from the lowest cleared line upwards changes, so their part of the hash is recomputed
+        lowest = min(lines)
+        self.board.hash ^= zobrist.rows_hash(CELL_KEYS, self.board.row_masks, lowest)
         for line_no in sorted(lines, reverse=True):
             self.remove_row(line_no)
         for _ in range(len(lines)):
             self.add_row()
+        self.board.update_columns()
+        self.board.hash ^= zobrist.rows_hash(CELL_KEYS, self.board.row_masks, lowest)
 
     def remove_row(self, row: int) -> None:
         self.board.board_arr.pop(row)
+        self.board.row_masks.pop(row)
 
     def add_row(self) -> None:
         add_empty_row(self.board.board_arr)
+        self.board.row_masks.append(0)
 
     def add_mino(self, mino: Mino) -> None:
         for block in mino.blocks:
             self.board.set_cell_colour(block, mino.colour)
+            self.locked_rows.add(block.y)
 
     def exceeds_playing_area(self) -> bool:
         """Checks if any block is outside of playing area (in the 21st row)"""
-        for i in range(self.board.columns):
-            if self.board.is_cell_occupied(Position(i, self.board.rows)):
-                # if not is_empty(self.board.board_arr[self.board.rows][i]):
-                return True
+        return self.board.row_masks[self.board.rows] != 0
+
+
+def shape_fits(row_masks: list[int], shape: ShapeMask, x: int, y: int) -> bool:
+    # Shift the mino's row masks to its column and AND them against the board's rows
+    left = x + shape.left
+    if left < 0 or x + shape.right >= COLUMNS:
+        return False
+    bottom = y + shape.bottom
+    if bottom < 0 or y + shape.top > ROWS:
         return False
+    for i, row in enumerate(shape.rows):
+        if row_masks[bottom + i] & (row << left):
+            return False
+    return True
 
 
 def get_corners(position: Position) -> list[Position]:
@@ -167,13 +326,6 @@ def is_empty(val) -> bool:
     return val == EMPTY
 
 
-def is_row_filled(row) -> bool:
-    for cell in row:
-        if is_empty(cell):
-            return False
-    return True
-
-
 def test():
     board = Board()
 
@@ -0,0 +1,267 @@
+"""
+Scores candidate placements with a weighted sum of features of the boards they result in.
+All candidates of a decision are evaluated at once: the resulting boards are built as one stacked array
+of row bitmasks, and every feature is computed with NumPy over the whole stack.
+
+Requires NumPy (pip install numpy).
+"""
+from dataclasses import dataclass, astuple, fields
+
+import numpy as np
+
+import board as bd
+from board import SHAPE_MASKS
+from game import Game
+from lineclear import LineClear
+from mino import PieceState
+from movegen import Placement
+
+# Features of each placement, in the order of the columns returned by placement_features.
+# The first PLACEMENT_FEATURES depend on the placement itself, the others only on the resulting board
+FEATURES = ('landing_height', 'lines', 'line_clear_score', 'aggregate_height', 'max_height', 'holes',
+            'bumpiness', 'row_transitions', 'column_transitions', 'wells')
+PLACEMENT_FEATURES = 3
+
+# LINE_CLEAR_SCORES[tspin][lines] is LineClear.score, with 0 for no lines cleared
+LINE_CLEAR_SCORES = np.array([[LineClear(lines, tspin).score if lines else 0 for lines in range(5)]
+                              for tspin in (False, True)])
+COLUMN_BITS = np.arange(bd.COLUMNS, dtype=np.int64)
+
+
+@dataclass(frozen=True)
+class Weights:
+    """Weight of each feature (see FEATURES), a placement's score is the weighted sum of its features"""
+    landing_height: float = 0
+    lines: float = 0
+    line_clear_score: float = 0
+    aggregate_height: float = 0
+    max_height: float = 0
+    holes: float = 0
+    bumpiness: float = 0
+    row_transitions: float = 0
+    column_transitions: float = 0
+    wells: float = 0
+
+    def to_array(self) -> np.ndarray:
+        return np.array(astuple(self), dtype=np.float64)
+
+    @classmethod
+    def from_array(cls, values) -> 'Weights':
+        return cls(*(float(value) for value in values))
+
+
+assert tuple(f.name for f in fields(Weights)) == FEATURES
+
+# Weights of Pierre Dellacherie's features as tuned for El-Tetris, which play for survival
+DEFAULT_WEIGHTS = Weights(landing_height=-4.500158825082766, lines=3.4181268101392694,
+                          row_transitions=-3.2178882868487753, column_transitions=-9.348695305445199,
+                          holes=-7.899265427351652, wells=-3.3855972247263626)
+
+
+def lock_placements(row_masks, states: list[PieceState]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the (len(states), ROWS + 1) row masks of the boards after locking each state, before any lines
+    are cleared, and the landing height (height of the middle of the mino) of each state.
+    row_masks is either a single board that every state is locked on, or one board per state.
+    """
+    count = len(states)
+    boards = np.array(row_masks, dtype=np.int64)
+    boards = np.tile(boards, (count, 1)) if boards.ndim == 1 else boards.copy()
+    # Rows of each mino's blocks, shifted to their columns, with unused rows left 0
+    piece_rows = np.zeros((count, 4), dtype=np.int64)
+    bottoms = np.zeros(count, dtype=np.int64)
+    landing_heights = np.zeros(count, dtype=np.float64)
+    for i, state in enumerate(states):
+        shape = SHAPE_MASKS[(state.type, state.orientation)]
+        left = state.x + shape.left
+        for k, row in enumerate(shape.rows):
+            piece_rows[i, k] = row << left
+        bottoms[i] = state.y + shape.bottom
+        landing_heights[i] = state.y + (shape.bottom + shape.top) / 2 + 1
+    indices = np.arange(count)
+    for k in range(4):
+        # Rows past the top are only written for minos that have no block there
+        rows = np.minimum(bottoms + k, bd.ROWS)
+        boards[indices, rows] |= piece_rows[:, k]
+    return boards, landing_heights
+
+
+def clear_lines(boards: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Removes the full rows of every board, returning the boards and the number of lines cleared on each
+    full = boards == bd.FULL_ROW
+    lines = full.sum(axis=1)
+    # A stable sort on fullness moves full rows to the top and keeps the order of the others
+    order = np.argsort(full, axis=1, kind='stable')
+    boards = np.take_along_axis(boards, order, axis=1)
+    boards[np.arange(boards.shape[1]) >= boards.shape[1] - lines[:, None]] = 0
+    return boards, lines
+
+
+def board_cells(boards: np.ndarray) -> np.ndarray:
+    # cells[i, y, x] is whether cell (x, y) of board i is occupied
+    return ((boards[:, :, None] >> COLUMN_BITS) & 1).astype(bool)
+
+
+def cell_heights(cells: np.ndarray) -> np.ndarray:
+    # Height of the highest block of each column, 0 for empty columns
+    rows = cells.shape[1]
+    return np.where(cells.any(axis=1), rows - np.argmax(cells[:, ::-1, :], axis=1), 0)
+
+
+def column_heights(boards: np.ndarray) -> np.ndarray:
+    """(count, COLUMNS) heights of a (count, ROWS + 1) array of row masks, as in Board.column_heights"""
+    return cell_heights(board_cells(boards))
+
+
+def board_features(boards: np.ndarray) -> dict[str, np.ndarray]:
+    """Features of a (count, ROWS + 1) array of row masks that only depend on the boards themselves"""
+    cells = board_cells(boards)
+    rows = cells.shape[1]
+    heights = cell_heights(cells)
+    filled = cells.sum(axis=1)
+    max_heights = heights.max(axis=1)
+
+    # Transitions between filled and empty cells, with the walls and floor counting as filled.
+    # Rows above the highest block are left out, they would all count the same 2 transitions
+    playing_area = cells[:, :bd.ROWS, :]
+    walled = np.pad(playing_area, ((0, 0), (0, 0), (1, 1)), constant_values=True)
+    row_transitions = (walled[:, :, 1:] != walled[:, :, :-1]).sum(axis=2)
+    row_transitions = np.where(np.arange(bd.ROWS) < max_heights[:, None], row_transitions, 0).sum(axis=1)
+    floored = np.pad(playing_area, ((0, 0), (1, 0), (0, 0)), constant_values=True)
+    column_transitions = (floored[:, 1:, :] != floored[:, :-1, :]).sum(axis=(1, 2))
+
+    # Columns lower than both neighbours (or the wall) are wells, with deeper wells counting for more
+    wall = np.full((len(boards), 1), rows, dtype=heights.dtype)
+    neighbours = np.minimum(np.concatenate([wall, heights[:, :-1]], axis=1),
+                            np.concatenate([heights[:, 1:], wall], axis=1))
+    depths = np.maximum(neighbours - heights, 0)
+
+    return {
+        'aggregate_height': heights.sum(axis=1),
+        'max_height': max_heights,
+        'holes': (heights - filled).sum(axis=1),
+        'bumpiness': np.abs(np.diff(heights, axis=1)).sum(axis=1),
+        'row_transitions': row_transitions,
+        'column_transitions': column_transitions,
+        'wells': (depths * (depths + 1) // 2).sum(axis=1),
+    }
+
+
+def lock_and_evaluate(row_masks, states: list[PieceState],
+                      tspins: list[bool]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Locks each state (see lock_placements) and clears lines, returning the resulting boards,
+    a (len(states), len(FEATURES)) array with the features of each placement, and whether the game
+    would end (a block above the playing area after clearing lines)
+    """
+    boards, landing_heights = lock_placements(row_masks, states)
+    boards, lines = clear_lines(boards)
+    features = board_features(boards)
+    features['landing_height'] = landing_heights
+    features['lines'] = lines
+    features['line_clear_score'] = LINE_CLEAR_SCORES[np.array(tspins, dtype=np.int64), lines]
+    dead = boards[:, bd.ROWS] != 0
+    return boards, np.stack([features[name] for name in FEATURES], axis=1).astype(np.float64), dead
+
+
+def placement_features(row_masks, states: list[PieceState], tspins: list[bool]) -> tuple[np.ndarray, np.ndarray]:
+    """The features of locking each state on the board, and whether the game would end"""
+    _, features, dead = lock_and_evaluate(row_masks, states, tspins)
+    return features, dead
+
+
+def evaluate(row_masks: list[int], placements: list[Placement], weights: Weights) -> np.ndarray:
+    """Score of each placement on the board, -inf for placements that end the game"""
+    if not placements:
+        return np.zeros(0)
+    features, dead = placement_features(row_masks, [p.state for p in placements],
+                                        [p.tspin for p in placements])
+    scores = features @ weights.to_array()
+    scores[dead] = -np.inf
+    return scores
+
+
+class HeuristicPolicy:
+    """
+    Places each mino where the weighted features score highest, considering holding first if allowed.
+    Can be used wherever a runner.Policy is expected, ie. called with a game and returning (Placement, hold).
+    """
+
+    def __init__(self, weights: Weights = DEFAULT_WEIGHTS, use_hold: bool = True) -> None:
+        self.weights = weights
+        self.use_hold = use_hold
+
+    def __call__(self, game: Game) -> tuple[Placement, bool]:
+        candidates = [(placement, False) for placement in game.get_placements()]
+        if self.use_hold and game.hold.allow_hold:
+            candidates += [(placement, True) for placement in game.get_placements(True)]
+        scores = evaluate(game.board.row_masks, [placement for placement, _ in candidates], self.weights)
+        return candidates[int(np.argmax(scores))]
+
+
+def test():
+    import random
+    from perft import lock
+
+    def reference_features(row_masks: list[int]) -> dict[str, int]:
+        # Straightforward per board computation of board_features
+        cell = [[(row_masks[y] >> x) & 1 for x in range(bd.COLUMNS)] for y in range(bd.ROWS + 1)]
+        heights = [max((y + 1 for y in range(bd.ROWS + 1) if cell[y][x]), default=0) for x in range(bd.COLUMNS)]
+        holes = sum(1 for x in range(bd.COLUMNS) for y in range(heights[x]) if not cell[y][x])
+        row_transitions = 0
+        for y in range(max(heights)):
+            row = [1] + cell[y] + [1]
+            row_transitions += sum(row[x] != row[x + 1] for x in range(bd.COLUMNS + 1))
+        column_transitions = 0
+        for x in range(bd.COLUMNS):
+            column = [1] + [cell[y][x] for y in range(bd.ROWS)]
+            column_transitions += sum(column[y] != column[y + 1] for y in range(bd.ROWS))
+        wells = 0
+        for x in range(bd.COLUMNS):
+            left = heights[x - 1] if x > 0 else bd.ROWS + 1
+            right = heights[x + 1] if x < bd.COLUMNS - 1 else bd.ROWS + 1
+            depth = max(min(left, right) - heights[x], 0)
+            wells += depth * (depth + 1) // 2
+        return {'aggregate_height': sum(heights), 'max_height': max(heights), 'holes': holes,
+                'bumpiness': sum(abs(heights[x] - heights[x + 1]) for x in range(bd.COLUMNS - 1)),
+                'row_transitions': row_transitions, 'column_transitions': column_transitions, 'wells': wells}
+
+    # The vectorized features match the reference on the boards resulting from every placement of random games
+    rng = random.Random(0)
+    game = Game(seed=0)
+    game.start()
+    checked = 0
+    while checked < 2000:
+        if not game.alive:
+            game.start()
+        placements = game.get_placements()
+        features, dead = placement_features(game.board.row_masks, [p.state for p in placements],
+                                            [p.tspin for p in placements])
+        for placement, row, is_dead in zip(placements, features, dead):
+            locked = lock(game.board.row_masks, placement.state)
+            assert is_dead == (locked is None)
+            if locked is None:
+                continue
+            expected = reference_features(locked)
+            for name, value in expected.items():
+                assert row[FEATURES.index(name)] == value, (name, row[FEATURES.index(name)], value)
+            lines = sum(1 for row_mask in lock_placements(game.board.row_masks, [placement.state])[0][0]
+                        if row_mask == bd.FULL_ROW)
+            assert row[FEATURES.index('lines')] == lines
+            checked += 1
+        placement = rng.choice(placements)
+        game.place(placement.state, last_move=placement.last_move)
+
+    # The default weights survive for a while and clear lines
+    game = Game(seed=1)
+    game.start()
+    policy = HeuristicPolicy()
+    while game.alive and game.pieces_placed < 200:
+        placement, hold = policy(game)
+        game.place(placement.state, hold, placement.last_move)
+    assert game.alive and sum(game.line_clears.values()) > 50
+    print('evaluation tests passed')
+
+
+if __name__ == '__main__':
+    test()
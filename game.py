@@ -1,14 +1,18 @@
 import copy
+import time
 from dataclasses import dataclass, asdict
 from enum import Enum, auto
 
-from mino import Mino
+import mino as mn
+from mino import Mino, PieceState
 from board import Board, BoardManager
 from pieceholder import Hold, HoldDisabledException
 from piecequeue import PieceQueue
 from piecemovement import PieceMovement
+from movegen import MoveGenerator, Placement
 from lineclear import LineClear
-from inputs import GameInput
+from movetype import MoveType
+from inputs import GameInput, ticks_from_ms
 
 
 class EventType(Enum):
@@ -29,54 +33,223 @@ def default_history_dict() -> dict[LineClear, int]:
     }
 
 
+def shadow_colour(colour: tuple[int, int, int]) -> tuple[int, int, int]:
+    # Faded version of a mino's colour, used for its shadow
+    return (int(colour[0]/3), int(colour[1]/3), int(colour[2]/3))
+
+
+@dataclass(frozen=True, slots=True)
+class GameSnapshot:
+    """
+    Everything needed to continue a game from where it was, see Game.snapshot.
+    The board is packed into bytes (see Board.pack), as are the codes of the queued pieces.
+    """
+    cells: bytes
+    row_masks: tuple[int, ...]
+    column_heights: tuple[int, ...]
+    board_hash: int
+    current: PieceState
+    previous: PieceState | None
+    last_move: MoveType | None
+    held: str | None
+    allow_hold: bool
+    queue: bytes
+    random_state: tuple
+    alive: bool
+    ticks_since_last_drop: int
+    spawned_since_death_check: bool
+    pieces_placed: int
+    score: int
+    line_clears: tuple[int, ...]
+    previous_line_clear: LineClear | None
+
+
 class Game:
-    def __init__(self, gravity=30):
+    def __init__(self, gravity=30, seed: int | None = None, batch_notifications: bool = False):
         self.observers = []
         self.gravity = gravity
+        # Seed of the piece queue, a seeded game always gets the same sequence of pieces
+        self.seed = seed
+        # If set, events during update() or place() are collected and observers are notified once
+        # at the end through observer.update_batch(game, events), instead of once per event
+        self.batch_notifications = batch_notifications
+        self.pending_events: list[EventType] | None = None
+        # If set to a profiling.PhaseProfiler, each phase of update() and each observer call is timed
+        self.profiler = None
 
     def start(self):
         self.board: Board = Board()
         self.board_manager: BoardManager = BoardManager(self.board)
-        self.queue: PieceQueue = PieceQueue()
+        self.queue: PieceQueue = PieceQueue(self.seed)
         self.hold: Hold = Hold()
 
         self.move_handler: PieceMovement = PieceMovement()
-        # move_handler.hard_drop() is invoked when generating shadow, so we use a
-        # seperate instance to not affect normal movement (since move_handler) needs to keep
-        # track of previous movement for tspin detection
-        self.shadow_move_handler: PieceMovement = PieceMovement()
+        self.move_generator: MoveGenerator = MoveGenerator(
+            self.move_handler.kick_table)
 
         self.current_mino: Mino = self.queue.pop()
         self.previous_mino: Mino = None
+        # Death can only occur after a mino spawns, so the death check is skipped otherwise
+        self.spawned_since_death_check = True
 
         self.alive = True
         self.ticks_since_last_drop = 0
+        self.pieces_placed = 0
 
         self.previous_line_clear: LineClear = None
         self.line_clears: dict[LineClear, int] = default_history_dict()
+        self.score = 0
 
         self.notify_observers()
 
     def reset(self):
         self.start()
 
+    def snapshot(self) -> GameSnapshot:
+        """Captures the state of a started game, leaving out observers and settings (eg. gravity)"""
+        queue, random_state = self.queue.state()
+        held = self.hold.held_mino
+        return GameSnapshot(
+            self.board.pack(), tuple(self.board.row_masks), tuple(self.board.column_heights), self.board.hash,
+            self.current_mino.state,
+            self.previous_mino.state if self.previous_mino is not None else None,
+            self.move_handler.recent_move_executed,
+            held.type if held is not None else None, self.hold.allow_hold,
+            queue, random_state,
+            self.alive, self.ticks_since_last_drop, self.spawned_since_death_check,
+            self.pieces_placed, self.score, tuple(self.line_clears.values()), self.previous_line_clear)
+
+    def restore(self, snapshot: GameSnapshot) -> None:
+        """Returns the game to the state it was in when snapshot was taken, the game need not be started"""
+        self.board = Board.unpack(snapshot.cells, snapshot.row_masks, snapshot.column_heights,
+                                  snapshot.board_hash)
+        self.board_manager = BoardManager(self.board)
+        self.queue = PieceQueue.from_state(
+            snapshot.queue, snapshot.random_state)
+        self.hold = Hold(mn.create_mino(snapshot.held) if snapshot.held is not None else None,
+                         snapshot.allow_hold)
+
+        if not hasattr(self, 'move_handler'):
+            self.move_handler = PieceMovement()
+            self.move_generator = MoveGenerator(self.move_handler.kick_table)
+        self.move_handler.recent_move_executed = snapshot.last_move
+
+        self.current_mino = mn.mino_from_state(snapshot.current)
+        self.previous_mino = mn.mino_from_state(
+            snapshot.previous) if snapshot.previous is not None else None
+        self.spawned_since_death_check = snapshot.spawned_since_death_check
+
+        self.alive = snapshot.alive
+        self.ticks_since_last_drop = snapshot.ticks_since_last_drop
+        self.pieces_placed = snapshot.pieces_placed
+
+        self.previous_line_clear = snapshot.previous_line_clear
+        self.line_clears = dict(
+            zip(default_history_dict(), snapshot.line_clears))
+        self.score = snapshot.score
+
+        self.notify_observers()
+
+    def fork(self) -> 'Game':
+        """
+        Returns an independent copy of the game in its current state, without observers or profiler.
+        The copy shares the move generator, which keeps no state of its own besides a cache.
+        """
+        game = Game(self.gravity, self.seed)
+        game.move_handler = PieceMovement(self.move_handler.kick_table)
+        game.move_generator = self.move_generator
+        game.restore(self.snapshot())
+        return game
+
+    # The phases of update() in order, each called with the game and the frame's input.
+    # Shared by the plain and the profiled update, so that the profiler always times what update() does
+    UPDATE_PHASES = (
+        ('user_movements', lambda game, input: game.perform_user_movements(input)),
+        ('vertical_movement', lambda game, input: game.handle_vertical_movement(input)),
+        ('line_clears', lambda game, input: game.handle_line_clears()),
+        ('death_check', lambda game, input: game.check_and_handle_death()),
+    )
+
     def update(self, input: GameInput):
-        # Handle user input
-        self.perform_user_movements(input)
-        # Handle vertical movement
-        self.handle_vertical_movement(input)
-        # Handle line clears
-        self.handle_line_clears()
-        # Handle death
+        if self.profiler is not None:
+            self.profiled_update(input)
+            return
+        self.collect_events()
+        for _, perform in self.UPDATE_PHASES:
+            perform(self, input)
+        self.deliver_events()
+
+    def profiled_update(self, input: GameInput):
+        # Same as update(), timing each phase. Unless notifications are batched, observer calls
+        # are part of the phase that caused them (and are additionally timed on their own)
+        profiler = self.profiler
+        clock = time.perf_counter_ns
+        start = phase_start = clock()
+        self.collect_events()
+        for phase, perform in self.UPDATE_PHASES:
+            perform(self, input)
+            phase_end = clock()
+            profiler.record(phase, phase_end - phase_start)
+            phase_start = phase_end
+        # Only recorded for updates with batched events to deliver
+        delivering = bool(self.pending_events)
+        self.deliver_events()
+        end = clock()
+        if delivering:
+            profiler.record('deliver_events', end - phase_start)
+        profiler.record('update', end - start)
+        profiler.end_update()
+
+    def place(self, state: PieceState, hold: bool = False, last_move: MoveType = MoveType.DOWN) -> LineClear | None:
+        """
+        Places the current mino (or the mino obtained by holding first) at state in a single step,
+        instead of moving it there frame by frame.
+        state has to be a resting position reachable from the mino's spawn position, with last_move
+        being the final move used to get there (a rotation is required for tspins).
+        Returns the resulting line clear, if any.
+        """
+        if not self.alive:
+            raise ValueError('Cannot place a mino, the game is over')
+        mino = self.mino_after_hold() if hold else self.current_mino
+        if state.type != mino.type:
+            raise ValueError(
+                f'Cannot place {state.type} mino, current mino is {mino.type}')
+        resting = self.move_generator.resting_states(self.board, mino.state)
+        if state not in resting:
+            raise ValueError(f'{state} is not a reachable resting position')
+        if last_move.is_rotation() and not resting[state]:
+            raise ValueError(f'{state} cannot be reached with a rotation')
+
+        if hold and not self.hold_mino():
+            raise HoldDisabledException('Currently not allowed to hold')
+        self.collect_events()
+        self.current_mino.set_state(state)
+        self.move_handler.recent_move_executed = last_move
+        self.hard_drop()
+        line_clear = self.handle_line_clears()
         self.check_and_handle_death()
+        self.deliver_events()
+        return line_clear
 
-    def handle_line_clears(self):
+    def get_placements(self, hold: bool = False) -> list[Placement]:
+        """Unique lock positions of the current mino (or the mino obtained by holding first)"""
+        mino = self.mino_after_hold() if hold else self.current_mino
+        return self.move_generator.generate_placements(self.board, mino.state)
+
+    def mino_after_hold(self) -> Mino:
+        # The mino that would become the current mino if hold was performed now
+        if self.hold.held_mino is None:
+            return self.queue.peek()
+        return mn.create_mino(self.hold.held_mino.type)
+
+    def handle_line_clears(self) -> LineClear | None:
         # Check if there are any lines that need to be cleared
         line_clear = self.board_manager.find_and_clear_lines(
             self.previous_mino, self.move_handler.recent_move_executed)
         if line_clear is not None:
             self.add_line_clear(line_clear)
             self.notify_observers(EventType.LINE_CLEAR)
+        return line_clear
 
     def perform_user_movements(self, input: GameInput):
         """Handle user inputs for horizontal movement, holding, and rotation"""
@@ -130,11 +303,13 @@ class Game:
             self.spawn_mino()
         else:
             self.current_mino = previously_held
+            self.spawned_since_death_check = True
         return True
 
     def spawn_mino(self) -> None:
         self.previous_mino = self.current_mino
         self.current_mino = self.queue.pop()
+        self.spawned_since_death_check = True
 
     def handle_vertical_movement(self, input: GameInput) -> None:
         if input.hard_drop:
@@ -158,6 +333,7 @@ class Game:
             self.current_mino, self.board)  # Move mino to bottom
         # Mino becomes part of board now
         self.board_manager.add_mino(self.current_mino)
+        self.pieces_placed += 1
         self.spawn_mino()   # Spawn new mino
 
     def drop(self) -> None:
@@ -171,7 +347,15 @@ class Game:
     def gravity_pulls(self) -> bool:
         return self.ticks_since_last_drop > self.gravity
 
+    def set_gravity_ms(self, milliseconds: float, tick_rate: float) -> None:
+        # Sets gravity so that the mino drops once every given milliseconds when updated tick_rate
+        # times per second. The mino drops on the tick after gravity ticks have passed
+        self.gravity = max(ticks_from_ms(milliseconds, tick_rate) - 1, 0)
+
     def check_and_handle_death(self):
+        if not self.spawned_since_death_check:
+            return
+        self.spawned_since_death_check = False
         dead = self.check_death()
         if dead:
             self.notify_observers(EventType.DEATH)
@@ -191,21 +375,20 @@ class Game:
         self.alive = False
 
     def get_shadow(self):
-        def fade_colour(colour: tuple[int, int, int]) -> tuple[int, int, int]:
-            # return (169, 169, 169)
-            return (int(colour[0]/3), int(colour[1]/3), int(colour[2]/3))
-
         # Create copy of current mino
         shadow = copy.copy(self.current_mino)
         # Set colour as a faded version of its original colour
-        shadow.colour = fade_colour(shadow.colour)
-        # Move shadow down as much as possible
-        self.shadow_move_handler.hard_drop(shadow, self.board)
+        shadow.colour = shadow_colour(shadow.colour)
+        # Move shadow down as much as possible. dropped_state() does not record a move,
+        # so the move_handler's previous movement used for tspin detection is unaffected
+        shadow.set_state(self.move_handler.dropped_state(
+            shadow.state, self.board))
         return shadow
 
     @property
     def current_score(self) -> int:
-        return sum(clear_type.score * count for clear_type, count in self.line_clears.items())
+        # Kept up to date by add_line_clear instead of summing line_clears every time
+        return self.score
 
     def print_history(self) -> int:
         for lc, count in self.line_clears.items():
@@ -214,10 +397,89 @@ class Game:
     def add_line_clear(self, line_clear: LineClear) -> None:
         self.previous_line_clear = line_clear
         self.line_clears[line_clear] = self.line_clears.get(line_clear, 0) + 1
+        self.score += line_clear.score
 
     def register_observer(self, observer) -> None:
         self.observers.append(observer)
 
     def notify_observers(self, event: EventType = EventType.NORMAL) -> None:
+        if self.pending_events is not None:
+            self.pending_events.append(event)
+            return
         for observer in self.observers:
-            observer.update(self, event)
+            if self.profiler is not None:
+                self.profiled_call(observer, observer.update, event)
+            else:
+                observer.update(self, event)
+
+    def collect_events(self) -> None:
+        # Start collecting events instead of notifying observers immediately (if batching is enabled)
+        if self.batch_notifications:
+            self.pending_events = []
+
+    def deliver_events(self) -> None:
+        # Notify observers once of all events collected since collect_events()
+        events = self.pending_events
+        self.pending_events = None
+        if events:
+            for observer in self.observers:
+                if self.profiler is not None:
+                    self.profiled_call(observer, observer.update_batch, events)
+                else:
+                    observer.update_batch(self, events)
+
+    def profiled_call(self, observer, method, argument) -> None:
+        start = time.perf_counter_ns()
+        method(self, argument)
+        self.profiler.record(
+            f'observer:{type(observer).__name__}', time.perf_counter_ns() - start)
+
+
+def test():
+    import random
+    from headless import random_input
+
+    # A fork (or a restored game) plays out exactly like the original given the same inputs
+    def trace(game: Game, inputs: list[GameInput]) -> list:
+        states = []
+        for game_input in inputs:
+            game.update(game_input)
+            states.append((game.current_mino.state, game.board.pack(), game.hold.held_mino and game.hold.held_mino.type,
+                           game.score, game.alive, game.ticks_since_last_drop))
+        return states
+
+    next_input = random_input(1)
+    rng = random.Random(1)
+    for seed in range(3):
+        game = Game(gravity=3, seed=seed)
+        game.start()
+        for frame in range(rng.randrange(300, 1500)):
+            if game.alive:
+                game.update(next_input(game, frame))
+        inputs = [next_input(game, frame) for frame in range(600)]
+        snapshot = game.snapshot()
+        fork = game.fork()
+        expected = trace(game, inputs)
+        assert trace(fork, inputs) == expected
+        game.restore(snapshot)
+        assert game.snapshot() == snapshot
+        assert trace(game, inputs) == expected
+
+    # Placing a mino after the game ended is refused and leaves the game as it was
+    game = Game(seed=0)
+    game.start()
+    while game.alive:
+        placement = max(game.get_placements(), key=lambda p: p.state.y)
+        game.place(placement.state, last_move=placement.last_move)
+    snapshot = game.snapshot()
+    try:
+        game.place(game.current_mino.state)
+        assert False, 'placed a mino after the game ended'
+    except ValueError:
+        pass
+    assert game.snapshot() == snapshot
+    print('Game snapshot tests passed')
+
+
+if __name__ == '__main__':
+    test()
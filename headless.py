@@ -0,0 +1,100 @@
+"""
+Runs the game without pygame, for simulations and bots.
+Nothing imported from here (directly or indirectly) may import pygame.
+
+Usage: python headless.py --frames 100000
+"""
+import argparse
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from game import Game
+from inputs import GameInput
+
+# An input source is called once per frame with the game and the frame number
+InputSource = Callable[[Game, int], GameInput]
+
+
+@dataclass
+class RunStats:
+    frames: int = 0
+    pieces: int = 0
+    games: int = 0
+    score: int = 0
+    seconds: float = 0
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.seconds if self.seconds else 0
+
+    @property
+    def pieces_per_second(self) -> float:
+        return self.pieces / self.seconds if self.seconds else 0
+
+
+def idle_input(game: Game, frame: int) -> GameInput:
+    # No keys pressed, pieces only fall due to gravity
+    return GameInput()
+
+
+def random_input(seed: int | None = None) -> InputSource:
+    # Presses each key at random, with hard drops rare enough that pieces get moved around first
+    rng = random.Random(seed)
+    probabilities = (0.2, 0.2, 0.1, 0.1, 0.05, 0.03, 0.1, 0.04)
+
+    def next_input(game: Game, frame: int) -> GameInput:
+        return GameInput(*(rng.random() < p for p in probabilities))
+    return next_input
+
+
+def run_frames(game: Game, frames: int, input_source: InputSource = idle_input, restart: bool = True) -> RunStats:
+    """
+    Updates the game for the given number of frames as fast as possible.
+    If restart is set, the game is restarted whenever it ends, otherwise the run stops early.
+    """
+    stats = RunStats(games=1)
+    game.start()
+    start_time = time.perf_counter()
+    for frame in range(frames):
+        if not game.alive:
+            stats.pieces += game.pieces_placed
+            stats.score += game.current_score
+            if not restart:
+                break
+            game.start()
+            stats.games += 1
+
+        game.update(input_source(game, frame))
+        stats.frames += 1
+
+    stats.seconds = time.perf_counter() - start_time
+    if game.alive:
+        stats.pieces += game.pieces_placed
+        stats.score += game.current_score
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run TetrisPy headlessly')
+    parser.add_argument('--frames', type=int, default=10000,
+                        help='number of frames to simulate')
+    parser.add_argument('--gravity', type=int, default=30,
+                        help='frames between each drop due to gravity')
+    parser.add_argument('--inputs', choices=['idle', 'random'], default='random',
+                        help='source of the inputs for each frame')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the random input source')
+    args = parser.parse_args()
+
+    input_source = idle_input if args.inputs == 'idle' else random_input(args.seed)
+    stats = run_frames(Game(gravity=args.gravity), args.frames, input_source)
+    print(f'{stats.frames} frames, {stats.pieces} pieces, {stats.games} games '
+          f'in {stats.seconds:.2f}s')
+    print(f'{stats.frames_per_second:.0f} frames/s, '
+          f'{stats.pieces_per_second:.0f} pieces/s')
+
+
+if __name__ == '__main__':
+    main()
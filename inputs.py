@@ -1,14 +1,4 @@
-from pygame.locals import *
-from dataclasses import dataclass, field
-
-MOVE_LEFT = K_LEFT
-MOVE_RIGHT = K_RIGHT
-ROTATE_CW = K_UP
-ROTATE_CCW = K_z
-ROTATE_180 = K_a
-HOLD = K_c
-SOFT_DROP = K_DOWN
-HARD_DROP = K_SPACE
+from dataclasses import dataclass, field, fields
 
 
 @dataclass
@@ -30,15 +20,29 @@ class GameInput(Input):
 
 @dataclass
 class UserInput(Input):
-    def __init__(self, inputs: list[bool]):
-        self.move_left = inputs[K_LEFT]
-        self.move_right = inputs[K_RIGHT]
-        self.rotate_cw = inputs[K_UP]
-        self.rotate_ccw = inputs[K_z]
-        self.rotate_180 = inputs[K_a]
-        self.hold = inputs[K_c]
-        self.soft_drop = inputs[K_DOWN]
-        self.hard_drop = inputs[K_SPACE]
+    """Keys held down by the user. See pygameinputs.py for creating one from pygame's key state."""
+    pass
+
+
+@dataclass(frozen=True)
+class KeyEvent:
+    """
+    A key press or release, with action being the name of the corresponding Input field
+    and time the moment it happened in milliseconds. See pygameinputs.py for creating one from a pygame event.
+    """
+    action: str
+    pressed: bool
+    time: float
+
+
+INPUT_ACTIONS = [f.name for f in fields(Input)]
+# Actions that are performed once per key press
+TAP_ACTIONS = ('rotate_cw', 'rotate_ccw', 'rotate_180', 'hold', 'hard_drop')
+
+
+def ticks_from_ms(milliseconds: float, tick_rate: float) -> int:
+    # Number of ticks closest to the given duration when updating tick_rate times per second
+    return round(milliseconds * tick_rate / 1000)
 
 
 def require_auto_shift(ticks: int, arr: int, das: int) -> bool:
@@ -74,6 +78,13 @@ class InputProcessor:
     softdrop_held_for: int = field(default=0, init=False)
     horizontal_direction: int = field(default=0, init=False)
 
+    @classmethod
+    def from_milliseconds(cls, das: float, arr: float, softdrop_interval: float, tick_rate: float) -> 'InputProcessor':
+        """Creates an InputProcessor for tick_rate updates per second with delays given in milliseconds"""
+        return cls(ticks_from_ms(das, tick_rate),
+                   max(ticks_from_ms(arr, tick_rate), 1),
+                   max(ticks_from_ms(softdrop_interval, tick_rate), 1))
+
     def process_inputs(self, inputs: UserInput) -> GameInput:
         move_left, move_right = self.handle_horizontal_inputs(
             inputs.move_left, inputs.move_right)
@@ -173,10 +184,148 @@ class InputProcessor:
         return softdrop, harddrop
 
 
-def test():
+@dataclass
+class TimedInputProcessor:
+    """
+    Translates timestamped key events to game inputs, with DAS, ARR and softdrop delays measured in
+    milliseconds instead of frames. Presses are remembered until the next call to process_inputs, so a
+    key tapped and released within a single frame is still performed, and presses beyond one per frame
+    are performed on the following frames instead of being dropped.
+    The defaults are the same as InputProcessor's at 60 frames per second.
+    """
+    das: float = 10 * 1000 / 60
+    arr: float = 1 * 1000 / 60
+    softdrop_interval: float = 2 * 1000 / 60
+
+    # Variables to remember state
+    held: dict[str, bool] = field(default_factory=lambda: dict.fromkeys(INPUT_ACTIONS, False), init=False)
+    pending_taps: dict[str, int] = field(default_factory=lambda: dict.fromkeys(TAP_ACTIONS, 0), init=False)
+    # Direction of the most recently pressed horizontal key that is still held (-1, 0 or 1)
+    horizontal_direction: int = field(default=0, init=False)
+    # Initial movements still to be performed for each direction, kept after the key is released
+    pending_shifts: dict[int, int] = field(default_factory=lambda: {-1: 0, 1: 0}, init=False)
+    next_auto_shift: float = field(default=0, init=False)
+    pending_softdrop: bool = field(default=False, init=False)
+    next_softdrop: float = field(default=0, init=False)
+
+    def handle_event(self, event: KeyEvent) -> None:
+        if event.action not in self.held:
+            raise ValueError(f'Unknown action {event.action}')
+        was_held = self.held[event.action]
+        self.held[event.action] = event.pressed
+        if event.pressed and not was_held:
+            self.handle_press(event.action, event.time)
+        elif not event.pressed and was_held:
+            self.handle_release(event.action, event.time)
+
+    def handle_press(self, action: str, time: float) -> None:
+        if action in self.pending_taps:
+            self.pending_taps[action] += 1
+        elif action in ('move_left', 'move_right'):
+            direction = -1 if action == 'move_left' else 1
+            self.pending_shifts[direction] += 1
+            self.start_horizontal(direction, time)
+        elif action == 'soft_drop':
+            self.pending_softdrop = True
+            self.next_softdrop = time + self.softdrop_interval
+
+    def handle_release(self, action: str, time: float) -> None:
+        direction = {'move_left': -1, 'move_right': 1}.get(action)
+        if direction is not None and direction == self.horizontal_direction:
+            # Fall back to the other direction if its key is still held, as if it was pressed again
+            other = 'move_right' if direction < 0 else 'move_left'
+            if self.held[other]:
+                self.pending_shifts[-direction] = max(self.pending_shifts[-direction], 1)
+                self.start_horizontal(-direction, time)
+            else:
+                self.horizontal_direction = 0
+
+    def start_horizontal(self, direction: int, time: float) -> None:
+        self.horizontal_direction = direction
+        self.next_auto_shift = time + self.das
+
+    def process_inputs(self, now: float) -> GameInput:
+        """Returns the game input for a frame starting at now (in milliseconds)"""
+        game_input = GameInput()
+        for action, count in self.pending_taps.items():
+            if count:
+                setattr(game_input, action, True)
+                self.pending_taps[action] = count - 1
+
+        # Only one movement can be performed per frame, pending presses (preferably of the held direction)
+        # go before auto shifting
+        shift = 0
+        preferred = self.horizontal_direction or -1
+        for direction in (preferred, -preferred):
+            if self.pending_shifts[direction]:
+                self.pending_shifts[direction] -= 1
+                shift = direction
+                break
+        else:
+            if self.horizontal_direction and now >= self.next_auto_shift:
+                self.next_auto_shift += self.arr
+                shift = self.horizontal_direction
+        game_input.move_left = shift < 0
+        game_input.move_right = shift > 0
+
+        if self.held['soft_drop'] and now >= self.next_softdrop:
+            self.pending_softdrop = True
+            self.next_softdrop = max(
+                self.next_softdrop + self.softdrop_interval, now)
+        if self.pending_softdrop:
+            game_input.soft_drop = True
+            self.pending_softdrop = False
+        return game_input
 
-    # print(UserInput(inputs))
-    return
+
+def test():
+    processor = TimedInputProcessor(das=100, arr=20, softdrop_interval=50)
+    # A tap within a single frame is not lost
+    processor.handle_event(KeyEvent('rotate_cw', True, 1))
+    processor.handle_event(KeyEvent('rotate_cw', False, 5))
+    assert processor.process_inputs(16).rotate_cw
+    assert not processor.process_inputs(32).rotate_cw
+    # Two taps within a frame are performed on consecutive frames
+    for time in (33, 35, 37, 39):
+        processor.handle_event(KeyEvent('hold', time in (33, 37), time))
+    assert processor.process_inputs(48).hold
+    assert processor.process_inputs(64).hold
+    assert not processor.process_inputs(80).hold
+
+    # Holding left moves once, then waits for DAS, then moves every ARR
+    processor.handle_event(KeyEvent('move_left', True, 100))
+    moves = [processor.process_inputs(time).move_left for time in range(100, 300, 10)]
+    assert moves.count(True) == 1 + len(range(200, 300, 20))
+    assert moves[0] and not any(moves[1:10]) and moves[10]
+    # Pressing right while left is held moves right, and releasing it continues moving left after DAS
+    processor.handle_event(KeyEvent('move_right', True, 300))
+    assert processor.process_inputs(300).move_right
+    processor.handle_event(KeyEvent('move_right', False, 310))
+    assert processor.process_inputs(310).move_left
+    assert not processor.process_inputs(320).move_left
+    processor.handle_event(KeyEvent('move_left', False, 330))
+    assert not any(processor.process_inputs(time).move_left for time in range(330, 600, 10))
+    # A horizontal tap within a single frame still moves once
+    processor.handle_event(KeyEvent('move_left', True, 601))
+    processor.handle_event(KeyEvent('move_left', False, 605))
+    moves = [processor.process_inputs(time) for time in range(610, 800, 10)]
+    assert moves[0].move_left and not any(m.move_left or m.move_right for m in moves[1:])
+    # Two taps within a frame move twice, on consecutive frames
+    for time in (801, 803, 805, 807):
+        processor.handle_event(KeyEvent('move_right', time in (801, 805), time))
+    moves = [processor.process_inputs(time).move_right for time in range(810, 1000, 10)]
+    assert moves[:2] == [True, True] and not any(moves[2:])
+
+    # Soft drop happens on press and then every interval
+    processor.handle_event(KeyEvent('soft_drop', True, 1000))
+    drops = [processor.process_inputs(time).soft_drop for time in range(1000, 1200, 10)]
+    assert drops.count(True) == 4 and drops[0] and drops[5]
+    print('TimedInputProcessor tests passed')
+
+    # The default delays at 60 ticks per second are the same as the default frame counts,
+    # and take four times as many ticks at 240 ticks per second
+    assert InputProcessor.from_milliseconds(10 * 1000 / 60, 1000 / 60, 2 * 1000 / 60, 60) == InputProcessor()
+    assert InputProcessor.from_milliseconds(10 * 1000 / 60, 1000 / 60, 2 * 1000 / 60, 240) == InputProcessor(40, 4, 8)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,19 @@
+# Screen layout shared by View and PixelRenderer. Positions are (x, y) in pixels from the top left corner.
+SCREEN_WIDTH = 700
+SCREEN_HEIGHT = 700
+BOARD_POSITION = (200, 20)
+HOLDER_POSITION = (70, 50)
+HOLDER_CELLS = (4, 2)
+PREVIEW_POSITION = (550, 50)
+PREVIEW_CELLS = (4, 2)
+PREVIEW_MARGIN = 15
+PREVIEW_PIECES = 5
+CELL_WIDTH = 30
+
+SCORE_POSITION = (50, 200)
+
+# RGB values of the colour names used by the board and View
+COLOUR_NAMES = {
+    'grey': (190, 190, 190),
+    'black': (0, 0, 0)
+}
@@ -1,44 +1,101 @@
+import argparse
+import math
+
 import pygame
 from pygame.locals import *
 
 from game import Game
-from inputs import UserInput, InputProcessor
-from view import View
+from inputs import TimedInputProcessor
+from profiling import PhaseProfiler
+from pygameinputs import key_event_from_pygame
+from replay import ReplayRecorder
+from view import DirtyRectView
+
+# Time between drops due to gravity, the game's default of 30 frames at 60 frames per second
+GRAVITY_MS = 31 * 1000 / 60
+# Longest stretch of time simulated at once, so that the game does not try to catch up after a stall
+# (eg. the window being dragged) by running many updates in a row
+MAX_CATCH_UP_MS = 250
 
 
-def main():
-    game = Game()
-    view = View()
+def main(record_path: str | None = None, seed: int | None = None, tick_rate: int = 60, fps: int = 60,
+         profile_interval: float | None = None):
+    """
+    Runs the game with a fixed time step: the game is updated tick_rate times per second of real time,
+    independent of the screen, which is drawn at most fps times per second.
+    If profile_interval is set, timings of the game's updates are printed every profile_interval seconds.
+    """
+    game = Game(seed=seed, batch_notifications=True)
+    game.set_gravity_ms(GRAVITY_MS, tick_rate)
+    if profile_interval is not None:
+        game.profiler = PhaseProfiler(dump_interval=profile_interval)
+    view = DirtyRectView(auto_render=False)
     game.register_observer(view)
-    input_processor = InputProcessor()
+    input_processor = TimedInputProcessor()
+    recorder = ReplayRecorder(game, tick_rate) if record_path else None
 
     pygame.init()
-    clock = pygame.time.Clock()
     game.start()
 
+    tick_ms = 1000 / tick_rate
+    frame_ms = 1000 / fps
+    # Time up to which the game has been simulated, and when the screen is next due to be drawn
+    simulated_until = next_render = pygame.time.get_ticks()
     while game.alive:
-        # Handle termination / reset
+        # Handle termination / reset, and pass key presses and releases on to the input processor
+        # so that keys tapped between two frames are not missed
         for event in pygame.event.get():
-            if event.type == KEYDOWN:
+            key_event = key_event_from_pygame(event)
+            if key_event is not None:
+                input_processor.handle_event(key_event)
+            elif event.type == KEYDOWN:
                 if event.key == K_ESCAPE:
                     game.end()
                 elif event.key == K_F4:
+                    # The recorder may give the game a new seed, which the restarted game has to use
+                    if recorder is not None:
+                        recorder.reset()
                     game.start()
             elif event.type == QUIT:
                 game.end()
 
-        # Get user input and process it to obtain game input
-        inputs = input_processor.process_inputs(
-            UserInput(pygame.key.get_pressed())
-        )
-        # Tick the game and update based on input
-        game.update(inputs)
+        # Tick the game for every time step that has passed since the last update
+        now = pygame.time.get_ticks()
+        simulated_until = max(simulated_until, now - MAX_CATCH_UP_MS)
+        while game.alive and simulated_until + tick_ms <= now:
+            simulated_until += tick_ms
+            inputs = input_processor.process_inputs(simulated_until)
+            if recorder is not None:
+                recorder.update(inputs)
+            else:
+                game.update(inputs)
+
+        # Draw the game if it changed, limited to fps frames per second
+        if now >= next_render:
+            view.render_pending(game)
+            next_render = max(next_render + frame_ms, now)
 
-        # Limit framerate
-        clock.tick(60)
+        # Wait until the next update or frame is due
+        wait = min(simulated_until + tick_ms, next_render) - pygame.time.get_ticks()
+        if wait > 0:
+            pygame.time.wait(math.ceil(wait))
 
+    if recorder is not None:
+        recorder.replay.save(record_path)
     pygame.quit()
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Play TetrisPy')
+    parser.add_argument('--record', metavar='PATH',
+                        help='save a replay of the game to PATH')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed of the piece queue')
+    parser.add_argument('--tick-rate', type=int, default=60,
+                        help='game updates per second, higher rates respond to input more precisely')
+    parser.add_argument('--fps', type=int, default=60,
+                        help='maximum number of frames drawn per second')
+    parser.add_argument('--profile', type=float, metavar='SECONDS', default=None,
+                        help='print timings of each phase of the game\'s updates every SECONDS')
+    args = parser.parse_args()
+    main(args.record, args.seed, args.tick_rate, args.fps, args.profile)
@@ -1,9 +1,12 @@
+from __future__ import annotations
 from abc import ABC, abstractproperty
 from dataclasses import dataclass
 from enum import Enum
 
 from position import Position, GridPosition
 
+MINO_TYPES = ('I', 'J', 'L', 'Z', 'S', 'T', 'O')
+
 
 class Orientation(Enum):
     UP = 0
@@ -22,6 +25,28 @@ def rotations_required(start: Orientation, end: Orientation):
     return (end.value - start.value) % len(Orientation)
 
 
+@dataclass(frozen=True, slots=True)
+class PieceState:
+    """
+    Immutable value describing a mino on the board: its type, orientation and center.
+    Used to explore moves without mutating or copying Mino objects.
+    """
+    type: str
+    orientation: Orientation
+    x: int
+    y: int
+
+    @property
+    def cells(self) -> list[tuple[int, int]]:
+        return [(self.x + dx, self.y + dy) for dx, dy in SHAPES[(self.type, self.orientation)]]
+
+    def translated(self, dx: int, dy: int) -> PieceState:
+        return PieceState(self.type, self.orientation, self.x + dx, self.y + dy)
+
+    def rotated(self, orientation: Orientation, dx: int = 0, dy: int = 0) -> PieceState:
+        return PieceState(self.type, orientation, self.x + dx, self.y + dy)
+
+
 @dataclass
 class Mino(ABC):
     center: Position | GridPosition
@@ -33,7 +58,23 @@ class Mino(ABC):
 
     @property
     def blocks(self) -> list[Position]:
-        # Returns the position of the four mino blocks based on its current orientation and center
+        # Returns the position of the four mino blocks based on its current orientation and center,
+        # looked up from the precomputed SHAPES table
+        x = self.center.x
+        y = self.center.y
+        return [Position(x + dx, y + dy) for dx, dy in SHAPES[(self.type, self.orientation)]]
+
+    @property
+    def state(self) -> PieceState:
+        return PieceState(self.type, self.orientation, self.center.x, self.center.y)
+
+    def set_state(self, state: PieceState) -> None:
+        # The center keeps its class, since I and O minos are centered on a GridPosition
+        self.center = type(self.center)(state.x, state.y)
+        self.orientation = state.orientation
+
+    def compute_blocks(self) -> list[Position]:
+        # Computes the position of the four mino blocks based on its current orientation and center
         # This default inherited method is used by LJZST minos.
         # O and I Minos will have to override this method as their center is in the middle of four cells,
         # unlike the other minos that have their center exactly on a cell.
@@ -84,8 +125,7 @@ class IMino(Mino):
     colour: tuple[int, int, int] = (0, 255, 255)
     type: str = 'I'
 
-    @property
-    def blocks(self) -> list[Position]:
+    def compute_blocks(self) -> list[Position]:
         match self.orientation:
             case Orientation.UP:
                 block1 = self.center.top_left_position
@@ -126,8 +166,7 @@ class OMino(Mino):
     colour: tuple[int, int, int] = (255, 255, 0)
     type: str = 'O'
 
-    @property
-    def blocks(self) -> list[Position]:
+    def compute_blocks(self) -> list[Position]:
         return [
             self.center.top_left_position,
             self.center.top_right_position,
@@ -236,11 +275,33 @@ def create_mino(type: str) -> Mino:
         case 'O': return OMino()
 
 
+def mino_from_state(state: PieceState) -> Mino:
+    mino = create_mino(state.type)
+    mino.set_state(state)
+    return mino
+
+
 def rotate(point: Position) -> Position:
     """Rotate point 90 degrees about origin"""
     return Position(point.y, -point.x)
 
 
+def build_shapes() -> dict[tuple[str, Orientation], tuple[tuple[int, int], ...]]:
+    # Offsets of the four blocks relative to the mino's center, for every type and orientation.
+    # Built once at import so that looking up blocks never has to rotate positions.
+    shapes = {}
+    for mino_type in MINO_TYPES:
+        mino = create_mino(mino_type)
+        for orientation in Orientation:
+            mino.orientation = orientation
+            shapes[(mino_type, orientation)] = tuple(
+                (block.x - mino.center.x, block.y - mino.center.y) for block in mino.compute_blocks())
+    return shapes
+
+
+SHAPES = build_shapes()
+
+
 def test():
     a = create_mino('I')
     print(a)
@@ -0,0 +1,190 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+import board as bd
+from board import Board, SHAPE_MASKS
+from kicktable import KickTable
+from mino import Orientation, PieceState
+from movetype import MoveType
+
+ORIENTATIONS = list(Orientation)
+TSPIN_CORNERS = ((-1, 1), (-1, -1), (1, 1), (1, -1))
+
+# Minimum number of empty rows between the stack and a mino for its moves to be unaffected by the stack,
+# since kicks can move a mino down by up to 2 rows
+FREE_ZONE_MARGIN = 3
+
+
+@dataclass(frozen=True, slots=True)
+class Placement:
+    """A resting position the mino can be locked at, and whether locking it there counts as a tspin"""
+    state: PieceState
+    tspin: bool
+
+    @property
+    def last_move(self) -> MoveType:
+        # Final move used to reach the placement, to be passed to Game.place
+        return MoveType.ROTATE_CW if self.tspin else MoveType.DOWN
+
+
+class MoveGenerator:
+    """
+    Finds every resting position a mino can reach from its spawn position, including
+    tucks and kick based spins, by searching over (orientation, x, y) states.
+    States are plain tuples during the search, no Mino objects are created or modified.
+    """
+
+    def __init__(self, kick_table: KickTable = KickTable()) -> None:
+        self.kick_table = kick_table
+        self.rotation_tables: dict[str, list[list[tuple[int, list[tuple[int, int]]]]]] = {}
+        # The most recent result of resting_states, since a placement is usually generated and then
+        # validated by Game.place on the same board. It is shared by every caller, so it is read only
+        self.cached_key: tuple | None = None
+        self.cached_resting: Mapping[PieceState, bool] = MappingProxyType({})
+
+    def generate_placements(self, board: Board, start: PieceState) -> list[Placement]:
+        """Returns the unique lock positions reachable from start, each tagged with its tspin status"""
+        placements: dict[tuple, Placement] = {}
+        for state, rotated in self.resting_states(board, start).items():
+            shape = SHAPE_MASKS[(state.type, state.orientation)]
+            # Different states can cover the same cells (eg. S, Z and I minos), so they are keyed by their cells
+            left = state.x + shape.left
+            cells = (state.y + shape.bottom,
+                     tuple(row << left for row in shape.rows))
+            tspin = rotated and state.type == 'T' and is_tspin_position(
+                board.row_masks, state.x, state.y)
+            if cells not in placements or tspin and not placements[cells].tspin:
+                placements[cells] = Placement(state, tspin)
+        return list(placements.values())
+
+    def resting_states(self, board: Board, start: PieceState) -> Mapping[PieceState, bool]:
+        """
+        Returns a read only mapping from every reachable state that cannot move down any further to
+        whether the state can be entered with a rotation.
+        """
+        key = (start, tuple(board.row_masks))
+        if key == self.cached_key:
+            return self.cached_resting
+
+        fits = shape_fits_function(board.row_masks, start.type)
+        resting = {}
+        for (o, x, y), rotated in self.search(board, start).items():
+            if not fits(o, x, y - 1):
+                resting[PieceState(start.type, ORIENTATIONS[o], x, y)] = rotated
+        self.cached_key = key
+        self.cached_resting = MappingProxyType(resting)
+        return self.cached_resting
+
+    def search(self, board: Board, start: PieceState) -> dict[tuple[int, int, int], bool]:
+        """
+        Depth first search over every (orientation, x, y) reachable from start.
+        Each visited state maps to whether it can be entered with a rotation.
+        Movement high above the stack is identical at every height, so when possible the search
+        starts from all positions at the lowest such height instead of stepping down from start.
+        """
+        fits = shape_fits_function(board.row_masks, start.type)
+        rotations = self.rotation_table(start.type)
+        if not fits(start.orientation.value, start.x, start.y):
+            return {}
+
+        visited = free_zone_states(board, start)
+        if visited is None:
+            visited = {(start.orientation.value, start.x, start.y): False}
+        stack = list(visited)
+        while stack:
+            o, x, y = stack.pop()
+            for key in ((o, x - 1, y), (o, x + 1, y), (o, x, y - 1)):
+                if key not in visited and fits(*key):
+                    visited[key] = False
+                    stack.append(key)
+            for target, kicks in rotations[o]:
+                # Only the first valid kick is used
+                for dx, dy in kicks:
+                    if fits(target, x + dx, y + dy):
+                        key = (target, x + dx, y + dy)
+                        if key not in visited:
+                            stack.append(key)
+                        visited[key] = True
+                        break
+        return visited
+
+    def rotation_table(self, mino_type: str) -> list[list[tuple[int, list[tuple[int, int]]]]]:
+        # For each orientation, the target orientation and kicks of the cw, ccw and 180 degree rotations
+        if mino_type not in self.rotation_tables:
+            table = []
+            for o in range(len(ORIENTATIONS)):
+                cw = (o + 1) % len(ORIENTATIONS)
+                ccw = (o - 1) % len(ORIENTATIONS)
+                table.append([
+                    (cw, self.kick_table.get_kicks(o, cw, mino_type)),
+                    (ccw, self.kick_table.get_kicks(o, ccw, mino_type)),
+                    # 180 degree rotations do not kick
+                    ((o + 2) % len(ORIENTATIONS), [(0, 0)])
+                ])
+            self.rotation_tables[mino_type] = table
+        return self.rotation_tables[mino_type]
+
+
+def shape_fits_function(row_masks: list[int], mino_type: str):
+    # Returns fits(orientation, x, y) for the given mino type. Same as board.shape_fits,
+    # with the shape masks unpacked in advance since this is called for every explored state
+    shapes = [(shape.left, shape.right, shape.bottom, shape.top, shape.rows)
+              for shape in (SHAPE_MASKS[(mino_type, orientation)] for orientation in ORIENTATIONS)]
+    columns = bd.COLUMNS
+    rows = bd.ROWS
+
+    def fits(o: int, x: int, y: int) -> bool:
+        left, right, bottom, top, shape_rows = shapes[o]
+        left += x
+        bottom += y
+        if left < 0 or x + right >= columns or bottom < 0 or y + top > rows:
+            return False
+        for row in shape_rows:
+            if row_masks[bottom] & (row << left):
+                return False
+            bottom += 1
+        return True
+    return fits
+
+
+def free_zone_states(board: Board, start: PieceState) -> dict[tuple[int, int, int], bool] | None:
+    """
+    If start is high enough above the stack, returns every position (within the walls) the mino can
+    take at the lowest height where the stack cannot affect any move, which are all reachable by
+    moving down and then rotating and shifting. Positions are mapped to whether they can be entered
+    with a rotation. Returns None if there is no such height.
+    """
+    shapes = [SHAPE_MASKS[(start.type, orientation)]
+              for orientation in ORIENTATIONS]
+    bottom = min(shape.bottom for shape in shapes)
+    top = max(shape.top for shape in shapes)
+    y = max(board.column_heights) + FREE_ZONE_MARGIN - bottom
+    if y > start.y or y + top > bd.ROWS:
+        return None
+    # Every orientation must be reachable by rotating without kicks at the start column
+    if not all(0 <= start.x + shape.left and start.x + shape.right < bd.COLUMNS for shape in shapes):
+        return None
+
+    states = {}
+    for o, shape in enumerate(shapes):
+        for x in range(-shape.left, bd.COLUMNS - shape.right):
+            # Entered by rotating without kicks from any other orientation that fits at this column
+            rotated = any(0 <= x + other.left and x + other.right < bd.COLUMNS
+                          for other_o, other in enumerate(shapes) if other_o != o)
+            states[(o, x, y)] = rotated
+    return states
+
+
+def is_tspin_position(row_masks: list[int], x: int, y: int) -> bool:
+    # 3-4 corners of the center of the TMino should be occupied,
+    # with the walls and floor of the board counting as occupied (see BoardManager.detect_tspin)
+    occupied_corners = 0
+    for dx, dy in TSPIN_CORNERS:
+        cx = x + dx
+        cy = y + dy
+        if cx < 0 or cx >= bd.COLUMNS or cy < 0:
+            occupied_corners += 1
+        elif cy <= bd.ROWS and (row_masks[cy] >> cx) & 1:
+            occupied_corners += 1
+    return occupied_corners >= 3
@@ -0,0 +1,245 @@
+"""
+Counts the lock positions reachable through a sequence of pieces, like perft in chess engines.
+The counts verify the move generation (PieceMovement and the SRS KickTable), and the time taken measures its speed.
+
+perft(depth) is the number of different ways to place the first depth pieces of the sequence, where placements
+of a piece are distinct lock positions (sets of cells) reachable from its spawn position. With hold, the
+current piece can be swapped with the held one (or the next one, if nothing is held) before each placement.
+
+Usage: python perft.py --fixture tsd --sequence TIOLJ --depth 3 --hold
+       python perft.py --check
+"""
+import argparse
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
+import board as bd
+import mino as mn
+from board import Board, SHAPE_MASKS
+from mino import PieceState
+from movegen import MoveGenerator
+from piecemovement import PieceMovement, is_valid_state
+
+# Fixture boards, as rows from the top down with X for filled cells
+FIXTURES: dict[str, list[str]] = {
+    'empty': [],
+    # T-spin double slot at column 4, under an overhang at column 3
+    'tsd': [
+        'XXXX......',
+        'XXX...XXXX',
+        'XXXX.XXXX.',
+    ],
+    # T-spin triple slot at column 1, entered by kicking down past the overhang at column 2
+    'tst': [
+        '..X.......',
+        '...XXXXXXX',
+        '..XXXXXXXX',
+        'X.XXXXXXXX',
+    ],
+    # Stack close to the top with a well at the wall, where I pieces have to kick to rotate
+    'i_kick': [
+        'XXXXXX....',
+        'XXXXXX..XX',
+        'XXXXXXX.XX',
+        'XXXXXXX.XX',
+        'XXXXXXX.XX',
+        'XXXXXXX.XX',
+        'XXXXXXX.XX',
+        'XXXXXXX.XX',
+        'XXXXXXX.XX',
+        'XXXXXXX.XX',
+        'XXXXXXX.XX',
+        'XXXXXXX.XX',
+        'XXXXXXX.XX',
+        'XXXXXXX.XX',
+        'XXXXX.XXXX',
+        'XXXXXXX.XX',
+    ],
+}
+
+# Reference counts of (fixture, sequence, hold) for depths 1, 2, ...
+REFERENCE_COUNTS: dict[tuple[str, str, bool], list[int]] = {
+    ('empty', 'TIO', False): [34, 600, 5578],
+    ('empty', 'TIO', True): [51, 1637],
+    ('tsd', 'TLJ', False): [37, 1301, 47201],
+    ('tsd', 'TLJ', True): [71, 5088],
+    ('tst', 'TSZ', False): [37, 671],
+    ('tst', 'TSZ', True): [55, 2331],
+    ('i_kick', 'IOT', False): [17, 122, 3707],
+    ('i_kick', 'IOT', True): [26, 1025],
+}
+
+# Returns one resting state per distinct lock position reachable from start
+Generator = Callable[[Board, PieceState], list[PieceState]]
+
+
+@dataclass
+class PerftResult:
+    counts: list[int]
+    seconds: float
+    # Number of times placements were generated
+    generated: int
+
+    @property
+    def nodes_per_second(self) -> float:
+        return sum(self.counts) / self.seconds if self.seconds else 0
+
+
+def fixture_row_masks(name: str) -> list[int]:
+    rows = [sum(1 << x for x, cell in enumerate(row) if cell == 'X')
+            for row in reversed(FIXTURES[name])]
+    return rows + [0] * (bd.ROWS + 1 - len(rows))
+
+
+def movegen_generator() -> Generator:
+    move_generator = MoveGenerator()
+
+    def generate(board: Board, start: PieceState) -> list[PieceState]:
+        return [placement.state for placement in move_generator.generate_placements(board, start)]
+    return generate
+
+
+def reference_generator() -> Generator:
+    """
+    Breadth first search over the moves of PieceMovement, trying every kick of the KickTable through
+    rotated_state. Much slower than MoveGenerator, but shares none of its search code.
+    """
+    move_handler = PieceMovement()
+
+    def generate(board: Board, start: PieceState) -> list[PieceState]:
+        if not is_valid_state(start, board):
+            return []
+        visited = {start}
+        queue = deque([start])
+        placements = {}
+        while queue:
+            state = queue.popleft()
+            moves = [move_handler.translated_state(state, board, dx, dy)
+                     for dx, dy in ((-1, 0), (1, 0), (0, -1))]
+            moves += [move_handler.rotated_state(state, board, direction)
+                      for direction in ('cw', 'ccw', '180')]
+            for moved in moves:
+                if moved is not None and moved not in visited:
+                    visited.add(moved)
+                    queue.append(moved)
+            if move_handler.translated_state(state, board, 0, -1) is None:
+                placements.setdefault(lock_cells(state), state)
+        return list(placements.values())
+    return generate
+
+
+def lock_cells(state: PieceState) -> tuple[int, tuple[int, ...]]:
+    # The bottom row and row masks of the cells covered by state
+    shape = SHAPE_MASKS[(state.type, state.orientation)]
+    left = state.x + shape.left
+    return state.y + shape.bottom, tuple(row << left for row in shape.rows)
+
+
+def lock(row_masks: list[int], state: PieceState) -> list[int] | None:
+    """Returns the row masks after locking state and clearing filled lines, or None if the game ends"""
+    bottom, rows = lock_cells(state)
+    row_masks = list(row_masks)
+    for i, row in enumerate(rows):
+        row_masks[bottom + i] |= row
+    row_masks = [row for row in row_masks if row != bd.FULL_ROW]
+    row_masks += [0] * (bd.ROWS + 1 - len(row_masks))
+    if row_masks[bd.ROWS]:
+        return None
+    return row_masks
+
+
+def perft(row_masks: list[int], sequence: str, depth: int, hold: bool = False,
+          generate: Generator | None = None) -> PerftResult:
+    """Returns the number of placements at each depth from 1 to depth"""
+    if depth > len(sequence):
+        raise ValueError('The sequence has fewer pieces than the depth')
+    generate = generate or movegen_generator()
+    counts = [0] * depth
+    generated = 0
+
+    def search(row_masks: list[int], current: str, held: str | None, next_index: int, ply: int) -> None:
+        nonlocal generated
+        # Each choice is the piece to place, and the held piece and index of the next piece afterwards
+        choices = [(current, held, next_index)]
+        if hold and current != held:
+            if held is not None:
+                choices.append((held, current, next_index))
+            elif next_index < len(sequence):
+                choices.append((sequence[next_index], current, next_index + 1))
+
+        board = Board.from_row_masks(row_masks)
+        for piece, held_after, next_after in choices:
+            states = generate(board, mn.create_mino(piece).state)
+            generated += 1
+            counts[ply] += len(states)
+            if ply + 1 == depth or next_after >= len(sequence):
+                continue
+            for state in states:
+                locked = lock(row_masks, state)
+                if locked is not None:
+                    search(locked, sequence[next_after], held_after, next_after + 1, ply + 1)
+
+    start_time = time.perf_counter()
+    search(row_masks, sequence[0], None, 1, 0)
+    return PerftResult(counts, time.perf_counter() - start_time, generated)
+
+
+def check(depth: int | None = None, reference: bool = False) -> list[str]:
+    """Compares perft against every stored reference count, returning descriptions of mismatches"""
+    mismatches = []
+    for (fixture, sequence, hold), expected in REFERENCE_COUNTS.items():
+        expected = expected[:depth]
+        generate = reference_generator() if reference else movegen_generator()
+        result = perft(fixture_row_masks(fixture), sequence,
+                       len(expected), hold, generate)
+        if result.counts != expected:
+            mismatches.append(f'{fixture} {sequence} hold={hold}: '
+                              f'expected {expected}, got {result.counts}')
+    return mismatches
+
+
+def test():
+    # Every fixture has as many placements at depth 1 with both generators, and the stored counts match
+    for fixture in FIXTURES:
+        row_masks = fixture_row_masks(fixture)
+        for piece in mn.MINO_TYPES:
+            fast = perft(row_masks, piece, 1, generate=movegen_generator())
+            slow = perft(row_masks, piece, 1, generate=reference_generator())
+            assert fast.counts == slow.counts, (fixture, piece)
+    assert not check(depth=2, reference=True)
+    mismatches = check()
+    assert not mismatches, mismatches
+    print('perft tests passed')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count reachable lock positions through a piece sequence')
+    parser.add_argument('--fixture', choices=sorted(FIXTURES), default='empty')
+    parser.add_argument('--sequence', default='TIOLJSZ')
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--hold', action='store_true')
+    parser.add_argument('--reference', action='store_true',
+                        help='use the slow breadth first search over PieceMovement instead of MoveGenerator')
+    parser.add_argument('--check', action='store_true',
+                        help='compare against the stored reference counts')
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check(reference=args.reference)
+        print('\n'.join(mismatches) if mismatches else
+              f'All {len(REFERENCE_COUNTS)} reference counts match')
+        return
+
+    generate = reference_generator() if args.reference else movegen_generator()
+    result = perft(fixture_row_masks(args.fixture), args.sequence,
+                   args.depth, args.hold, generate)
+    for depth, count in enumerate(result.counts, start=1):
+        print(f'perft({depth}) = {count}')
+    print(f'{result.generated} generations in {result.seconds:.2f}s '
+          f'({result.nodes_per_second:.0f} nodes/s)')
+
+
+if __name__ == '__main__':
+    main()
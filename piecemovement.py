@@ -1,9 +1,5 @@
-from copy import copy
-from turtle import undo
-
 import mino as mn
-import board as bd
-from mino import Mino, Orientation
+from mino import Mino, Orientation, PieceState
 from board import Board
 from position import Position
 from kicktable import KickTable
@@ -12,67 +8,38 @@ from movetype import MoveType
 
 def is_valid_position(mino: Mino, board: Board):
     # Check to ensure that none of the mino's blocks are outside playing area or in an occupied cell
-    for block in mino.blocks:
-        # Check if it's inside the board
-        within_horizontal_area = 0 <= block.x < bd.COLUMNS
-        within_vertical_area = 0 <= block.y < bd.ROWS + 1
-        if not within_horizontal_area or not within_vertical_area:
-            return False
-        # Check if it's not on an occupied cell
-        if board.is_cell_occupied(block):
-            return False
-
-    return True
+    return board.fits(mino.type, mino.orientation, mino.center.x, mino.center.y)
 
 
-def undo_if_invalid(fn):
-    # Decorator to save position of mino before performing move
-    # And restores the mino back to the original position if the move results in an invalid mino position
-    # If the move was successfuly, set the move as the movehandler's recent_move_executed and return True
-    def wrappedfn(*args, **kwargs) -> bool:
-        movehandler: PieceMovement = args[0]
-        mino: Mino = args[1]
-        board: Board = args[2]
-        original_center = copy(mino.center)
-        original_orientation = copy(mino.orientation)
-        move_type = fn(*args, **kwargs)
-
-        success = is_valid_position(mino, board)
-        if success:
-            movehandler.recent_move_executed = move_type
-        else:
-            mino.center = original_center
-            mino.orientation = original_orientation
-        return success
-
-    return wrappedfn
+def is_valid_state(state: PieceState, board: Board) -> bool:
+    return board.fits(state.type, state.orientation, state.x, state.y)
 
 
 class PieceMovement:
+    """
+    Moves minos around the board. Moves are first resolved on immutable PieceStates
+    (see translated_state and rotated_state), and only applied to the Mino if the resulting position is valid.
+    """
+
     def __init__(self, kick_table: KickTable = KickTable()) -> None:
         self.kick_table: KickTable = kick_table
         self.recent_move_executed: MoveType = None
 
-    @ undo_if_invalid
-    def move_left(self, mino: Mino, board: Board) -> MoveType:
-        mino.left()
-        return MoveType.LEFT
+    def move_left(self, mino: Mino, board: Board) -> bool:
+        return self.apply_state(mino, self.translated_state(mino.state, board, -1, 0), MoveType.LEFT)
 
-    @ undo_if_invalid
-    def move_right(self, mino: Mino, board: Board) -> MoveType:
-        mino.right()
-        return MoveType.RIGHT
+    def move_right(self, mino: Mino, board: Board) -> bool:
+        return self.apply_state(mino, self.translated_state(mino.state, board, 1, 0), MoveType.RIGHT)
 
-    @ undo_if_invalid
-    def move_down(self, mino: Mino, board: Board) -> MoveType:
-        mino.down()
-        return MoveType.DOWN
+    def move_down(self, mino: Mino, board: Board) -> bool:
+        return self.apply_state(mino, self.translated_state(mino.state, board, 0, -1), MoveType.DOWN)
 
     def hard_drop(self, mino: Mino, board: Board) -> None:
         # Move mino down until no longer possible
-        dropped = self.move_down(mino, board)
-        while (dropped):
-            dropped = self.move_down(mino, board)
+        state = mino.state
+        dropped_state = self.dropped_state(state, board)
+        if dropped_state != state:
+            self.apply_state(mino, dropped_state, MoveType.DOWN)
 
     def rotate_cw(self, mino: Mino, board: Board) -> bool:
         return self.rotate_with_kicks(mino, board, 'cw')
@@ -80,39 +47,63 @@ class PieceMovement:
     def rotate_ccw(self, mino: Mino, board: Board) -> bool:
         return self.rotate_with_kicks(mino, board, 'ccw')
 
-    @undo_if_invalid
-    def rotate_180(self, mino: Mino, board: Board) -> MoveType:
-        mino.rotate_cw()
-        mino.rotate_cw()
-        return MoveType.ROTATE_180
+    def rotate_180(self, mino: Mino, board: Board) -> bool:
+        return self.rotate_with_kicks(mino, board, '180')
 
     def rotate_with_kicks(self, mino: Mino, board: Board, direction: str) -> bool:
-        current_orientation: Orientation = mino.orientation
-        target_orientation: Orientation = current_orientation.clockwise(
-        ) if direction == 'cw' else current_orientation.counterclockwise()
+        new_state = self.rotated_state(mino.state, board, direction)
+        return self.apply_state(mino, new_state, ROTATION_MOVE_TYPES[direction])
 
-        # Try each kicks in the kick table in sequence until the first valid kick is found
-        kicks = self.kick_table.get_kicks(
-            current_orientation.value, target_orientation.value, mino.type)
-        for kick in kicks:
-            success = self.rotate_with_kick(mino, board, direction, kick)
-            if success:
-                break
-        return success
-
-    @ undo_if_invalid
-    def rotate_with_kick(self, mino: Mino, board: Board, direction: str, offset: tuple[int, int]) -> MoveType:
-        # Rotates based on direction
+    def apply_state(self, mino: Mino, state: PieceState | None, move_type: MoveType) -> bool:
+        # If the move was successful, update the mino and set the move as the recent_move_executed
+        if state is None:
+            return False
+        mino.set_state(state)
+        self.recent_move_executed = move_type
+        return True
+
+    def translated_state(self, state: PieceState, board: Board, dx: int, dy: int) -> PieceState | None:
+        # Returns the state after translating by (dx, dy), or None if that position is invalid
+        new_state = state.translated(dx, dy)
+        if is_valid_state(new_state, board):
+            return new_state
+        return None
+
+    def dropped_state(self, state: PieceState, board: Board) -> PieceState:
+        # Returns the state after moving down as far as possible
+        distance = board.drop_distance(
+            state.type, state.orientation, state.x, state.y)
+        return state.translated(0, -distance)
+
+    def rotated_state(self, state: PieceState, board: Board, direction: str) -> PieceState | None:
+        # Returns the state after rotating in the given direction ('cw', 'ccw' or '180'),
+        # or None if none of the kicks results in a valid position
+        current_orientation: Orientation = state.orientation
         if direction == 'cw':
-            mino.rotate_cw()
-            rotate_type = MoveType.ROTATE_CW
+            target_orientation = current_orientation.clockwise()
         elif direction == 'ccw':
-            mino.rotate_ccw()
-            rotate_type = MoveType.ROTATE_CCW
+            target_orientation = current_orientation.counterclockwise()
+        else:
+            # 180 degree rotations do not kick
+            target_orientation = current_orientation.clockwise().clockwise()
+            new_state = state.rotated(target_orientation)
+            return new_state if is_valid_state(new_state, board) else None
 
-        # "Kick" the mino by translating based on the offset
-        mino.translate(offset)
-        return rotate_type
+        # Try each kicks in the kick table in sequence until the first valid kick is found
+        kicks = self.kick_table.get_kicks(
+            current_orientation.value, target_orientation.value, state.type)
+        for dx, dy in kicks:
+            # "Kick" the mino by translating based on the offset
+            if board.fits(state.type, target_orientation, state.x + dx, state.y + dy):
+                return state.rotated(target_orientation, dx, dy)
+        return None
+
+
+ROTATION_MOVE_TYPES = {
+    'cw': MoveType.ROTATE_CW,
+    'ccw': MoveType.ROTATE_CCW,
+    '180': MoveType.ROTATE_180
+}
 
 
 def test():
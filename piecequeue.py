@@ -1,35 +1,88 @@
 import random
+from collections import deque
+from itertools import islice
 
 import mino
-from mino import Mino
+from mino import Mino, MINO_TYPES
 
 PREVIEW_LENGTH = 5
+BAG = ['I', 'L', 'J', 'T', 'S', 'Z', 'O']
+# Pieces are queued as codes, their index into mino.MINO_TYPES
+TYPE_CODES = {mino_type: code for code, mino_type in enumerate(MINO_TYPES)}
+BAG_CODES = [TYPE_CODES[piece] for piece in BAG]
 
 
 class PieceQueue:
-    def __init__(self) -> None:
-        self.queue: list[Mino] = list()
+    """
+    7-bag randomizer. Upcoming pieces are kept as type codes, and Mino objects are only created
+    for pieces that are popped or peeked.
+    """
+
+    def __init__(self, seed: int | None = None) -> None:
+        # Each queue shuffles with its own random number generator, so that seeded queues are reproducible
+        self.random = random.Random(seed)
+        self.queue: deque[int] = deque()
+        # State of the random number generator as returned by state(), cached until the next bag
+        self.random_state: tuple | None = None
         self.add_new_bag()
 
     def __repr__(self) -> str:
-        return f'<PieceQueue: {self.queue}>'
+        return f'<PieceQueue: {self.peek_types(len(self.queue))}>'
 
     def add_new_bag(self) -> None:
-        bag = ['I', 'L', 'J', 'T', 'S', 'Z', 'O']
-        random.shuffle(bag)
-        for piece in bag:
-            self.queue.append(mino.create_mino(piece))
+        bag = BAG_CODES.copy()
+        self.random.shuffle(bag)
+        self.random_state = None
+        self.queue.extend(bag)
 
     def pop(self) -> Mino:
         if len(self.queue) <= PREVIEW_LENGTH:
             self.add_new_bag()
-        return self.queue.pop(0)
+        return mino.create_mino(MINO_TYPES[self.queue.popleft()])
 
     def peek(self, num: int = 1) -> Mino | list[Mino]:
+        # Peeked minos are new objects, changing them does not affect the queue
         if num == 1:
-            return self.queue[0]
+            return mino.create_mino(MINO_TYPES[self.queue[0]])
         else:
-            return self.queue[0:num]
+            return [mino.create_mino(piece) for piece in self.peek_types(num)]
+
+    def peek_types(self, num: int = 1) -> list[str]:
+        # Types of the next num pieces, without creating minos
+        return [MINO_TYPES[code] for code in islice(self.queue, num)]
+
+    def state(self) -> tuple[bytes, tuple]:
+        """
+        The codes of the queued pieces and the state of the random number generator, from which the queue
+        can be recreated with from_state. The generator's state is shared by every call until the next bag.
+        """
+        if self.random_state is None:
+            self.random_state = self.random.getstate()
+        return bytes(self.queue), self.random_state
+
+    @classmethod
+    def from_state(cls, codes: bytes, random_state: tuple) -> 'PieceQueue':
+        queue = cls.__new__(cls)
+        queue.random = random.Random()
+        queue.random.setstate(random_state)
+        queue.random_state = random_state
+        queue.queue = deque(codes)
+        return queue
+
+
+def generate_sequence(seed: int | None, count: int) -> bytes:
+    """
+    The first count pieces given out by a PieceQueue with the given seed, as type codes (see TYPE_CODES).
+    Much faster than popping them from a queue, for batch simulations and checking replays.
+    """
+    rng = random.Random(seed)
+    sequence = bytearray()
+    while len(sequence) < count:
+        bag = BAG_CODES.copy()
+        rng.shuffle(bag)
+        sequence += bytes(bag)
+    del sequence[count:]
+    return bytes(sequence)
 
 
 def main():
@@ -42,5 +95,18 @@ def main():
     print(queue)
 
 
+def test():
+    # The bulk sequence matches the pieces given out by a queue
+    for seed in range(5):
+        queue = PieceQueue(seed)
+        popped = [queue.pop().type for _ in range(100)]
+        assert [MINO_TYPES[code] for code in generate_sequence(seed, 100)] == popped
+    # Every bag holds each piece once
+    sequence = generate_sequence(0, 7 * 1000)
+    assert all(sorted(sequence[i:i + 7]) == list(range(7)) for i in range(0, len(sequence), 7))
+    print('PieceQueue tests passed')
+
+
 if __name__ == '__main__':
     main()
+    test()
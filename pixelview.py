@@ -0,0 +1,188 @@
+"""
+Renders the game into NumPy arrays without pygame or a display, for training agents on pixel observations.
+The layout matches View except that the score panel is left out, since text rendering requires pygame.
+Frames are drawn into preallocated arrays from the board's row masks and the pieces' types, without creating
+minos or per cell lists.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+import board as bd
+import mino as mn
+from game import Game, shadow_colour
+from layout import SCREEN_WIDTH, SCREEN_HEIGHT, BOARD_POSITION, HOLDER_POSITION, HOLDER_CELLS, \
+    PREVIEW_POSITION, PREVIEW_CELLS, PREVIEW_MARGIN, PREVIEW_PIECES, CELL_WIDTH, COLOUR_NAMES
+from mino import SHAPES
+
+BACKGROUND = COLOUR_NAMES['black']
+# Colour and block positions (relative to the center, in the spawn orientation) of each type of mino,
+# as drawn in the hold and preview boxes
+PIECES = {mino_type: (mino.colour, tuple((block.x, block.y) for block in mino.normalised_positions))
+          for mino_type, mino in ((mino_type, mn.create_mino(mino_type)) for mino_type in mn.MINO_TYPES)}
+
+
+def to_rgb(colour) -> tuple[int, int, int]:
+    # Board cells hold colour names as well as rgb tuples
+    return COLOUR_NAMES[colour] if isinstance(colour, str) else colour
+
+
+class PixelRenderer:
+    """
+    Renders frames as (height, width, 3) uint8 arrays, scaled down by an integer factor.
+    The same array is reused for every frame, so copy it if it has to be kept.
+    """
+
+    def __init__(self, downscale: int = 1) -> None:
+        lengths = (SCREEN_WIDTH, SCREEN_HEIGHT, *BOARD_POSITION, *HOLDER_POSITION,
+                   *PREVIEW_POSITION, PREVIEW_MARGIN, CELL_WIDTH)
+        if downscale < 1 or any(length % downscale for length in lengths):
+            raise ValueError(
+                f'The layout cannot be scaled down by a factor of {downscale}')
+        self.downscale = downscale
+        self.cell = CELL_WIDTH // downscale
+        self.height = SCREEN_HEIGHT // downscale
+        self.width = SCREEN_WIDTH // downscale
+        self.frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        self.frame_cells = self.board_cells(self.frame)
+        self.batch_frames = np.zeros((0, self.height, self.width, 3), dtype=np.uint8)
+        self.batch_cells = []
+
+        # Colours are looked up by their index into the palette, which grows as new colours are seen
+        self.palette_indices: dict = {}
+        self.shadow_indices: dict = {}
+        self.palette = np.zeros((0, 3), dtype=np.uint8)
+        self.empty_index = self.colour_index(bd.EMPTY)
+        self.cell_indices = np.zeros((bd.ROWS, bd.COLUMNS), dtype=np.intp)
+        self.cell_colours = np.zeros((bd.ROWS, bd.COLUMNS, 3), dtype=np.uint8)
+
+    def render(self, game: Game) -> np.ndarray:
+        """Renders the game into the renderer's frame and returns it"""
+        self.render_into(self.frame, game, self.frame_cells)
+        return self.frame
+
+    def render_batch(self, games: list[Game]) -> np.ndarray:
+        """Renders every game into a (len(games), height, width, 3) array, which is reused between calls"""
+        if len(self.batch_frames) != len(games):
+            self.batch_frames = np.zeros(
+                (len(games), self.height, self.width, 3), dtype=np.uint8)
+            self.batch_cells = [self.board_cells(frame) for frame in self.batch_frames]
+        for frame, cells, game in zip(self.batch_frames, self.batch_cells, games):
+            self.render_into(frame, game, cells)
+        return self.batch_frames
+
+    def render_into(self, frame: np.ndarray, game: Game, cells: np.ndarray | None = None) -> None:
+        """Renders the game into frame, with cells being board_cells(frame) if it was created in advance"""
+        frame[:] = BACKGROUND
+        self.draw_board(self.board_cells(frame) if cells is None else cells, game)
+        self.draw_hold(frame, game)
+        self.draw_previews(frame, game)
+
+    def colour_index(self, colour) -> int:
+        index = self.palette_indices.get(colour)
+        if index is None:
+            index = len(self.palette)
+            self.palette = np.vstack(
+                [self.palette, np.array([to_rgb(colour)], dtype=np.uint8)])
+            self.palette_indices[colour] = index
+        return index
+
+    def shadow_index(self, colour) -> int:
+        index = self.shadow_indices.get(colour)
+        if index is None:
+            index = self.shadow_indices[colour] = self.colour_index(shadow_colour(colour))
+        return index
+
+    def draw_board(self, cells: np.ndarray, game: Game) -> None:
+        # Cell colours are gathered into a (rows, columns, 3) array with row 0 at the top,
+        # which is then broadcast over every pixel of each cell in one assignment
+        indices = self.cell_indices
+        indices.fill(self.empty_index)
+        board = game.board
+        # Only the occupied cells of the board are looked at
+        for y in range(bd.ROWS):
+            row_mask = board.row_masks[y]
+            x = 0
+            while row_mask:
+                if row_mask & 1:
+                    indices[bd.ROWS - 1 - y, x] = self.colour_index(board.board_arr[y][x])
+                row_mask >>= 1
+                x += 1
+
+        # The shadow is the current mino dropped as far as it goes, drawn under the current mino
+        mino = game.current_mino
+        mino_x = mino.center.x
+        mino_y = mino.center.y
+        drop = board.drop_distance(mino.type, mino.orientation, mino_x, mino_y)
+        blocks = SHAPES[(mino.type, mino.orientation)]
+        for distance, index in ((drop, self.shadow_index(mino.colour)), (0, self.colour_index(mino.colour))):
+            for dx, dy in blocks:
+                y = mino_y - distance + dy
+                # Blocks above the top of the board are not drawn
+                if 0 <= y < bd.ROWS:
+                    indices[bd.ROWS - 1 - y, mino_x + dx] = index
+        np.take(self.palette, indices, axis=0, out=self.cell_colours)
+        cells[:] = self.cell_colours[:, None, :, None, :]
+
+    def board_cells(self, frame: np.ndarray) -> np.ndarray:
+        # Writable (rows, cell, columns, cell, 3) view of the board area of the frame
+        x = BOARD_POSITION[0] // self.downscale
+        y = BOARD_POSITION[1] // self.downscale
+        area = frame[y:y + bd.ROWS * self.cell, x:x + bd.COLUMNS * self.cell]
+        row_stride, column_stride, channel_stride = area.strides
+        return as_strided(area, shape=(bd.ROWS, self.cell, bd.COLUMNS, self.cell, 3),
+                          strides=(row_stride * self.cell, row_stride,
+                                   column_stride * self.cell, column_stride, channel_stride))
+
+    def draw_hold(self, frame: np.ndarray, game: Game) -> None:
+        mino = game.hold.held_mino
+        if mino is not None:
+            self.draw_piece(frame, mino.type, HOLDER_POSITION, HOLDER_CELLS)
+
+    def draw_previews(self, frame: np.ndarray, game: Game) -> None:
+        for i, piece in enumerate(game.queue.peek_types(PREVIEW_PIECES)):
+            # Offset due to the preceding preview pieces
+            vertical_offset = i * PREVIEW_CELLS[1] * (CELL_WIDTH + PREVIEW_MARGIN)
+            position = (PREVIEW_POSITION[0], PREVIEW_POSITION[1] + vertical_offset)
+            self.draw_piece(frame, piece, position, PREVIEW_CELLS)
+
+    def draw_piece(self, frame: np.ndarray, mino_type: str, position: tuple[int, int],
+                   cells: tuple[int, int]) -> None:
+        # Same placement as View.draw_hold and View.draw_preview, one column in from the left
+        colour, blocks = PIECES[mino_type]
+        for block_x, block_y in blocks:
+            x = ((block_x + 1) * CELL_WIDTH + position[0]) // self.downscale
+            y = ((cells[1] - block_y) * CELL_WIDTH + position[1]) // self.downscale
+            frame[y:y + self.cell, x:x + self.cell] = colour
+
+
+def test():
+    game = Game(seed=0)
+    game.start()
+    renderer = PixelRenderer()
+    frame = renderer.render(game)
+    assert frame.shape == (SCREEN_HEIGHT, SCREEN_WIDTH, 3)
+    # The top left cell of the board is empty and the current mino is drawn above the stack
+    assert tuple(frame[BOARD_POSITION[1], BOARD_POSITION[0]]) == COLOUR_NAMES['grey']
+    mino = game.current_mino
+    block = mino.blocks[0]
+    x = BOARD_POSITION[0] + block.x * CELL_WIDTH
+    y = BOARD_POSITION[1] + (bd.ROWS - 1 - block.y) * CELL_WIDTH
+    assert tuple(frame[y, x]) == mino.colour
+
+    # Rendering creates no minos, so it gives the same frame without get_shadow and peek
+    expected = frame.copy()
+
+    def create_mino(*args):
+        raise AssertionError('Rendering should not create minos')
+    game.get_shadow = game.queue.peek = create_mino
+    assert (renderer.render(game) == expected).all()
+
+    small = PixelRenderer(downscale=5)
+    frames = small.render_batch([game, game])
+    assert frames.shape == (2, SCREEN_HEIGHT // 5, SCREEN_WIDTH // 5, 3)
+    assert (frames[0] == frames[1]).all()
+    print('PixelRenderer tests passed')
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,111 @@
+"""
+Opt-in timing of the phases of Game.update and of observer notifications.
+Enable it with game.profiler = PhaseProfiler(), a game without a profiler is not timed at all.
+"""
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
+# Durations of the most recent calls kept for each phase
+DEFAULT_WINDOW = 1000
+
+
+@dataclass(frozen=True)
+class PhaseStats:
+    """Statistics of the most recent durations of a phase, in microseconds"""
+    count: int
+    p50: float
+    p99: float
+    max: float
+
+
+def percentile(sorted_samples: list[int], q: float) -> int:
+    # Nearest rank percentile of already sorted samples
+    index = min(int(q * len(sorted_samples)), len(sorted_samples) - 1)
+    return sorted_samples[index]
+
+
+class PhaseProfiler:
+    """
+    Keeps the durations (in nanoseconds, measured with time.perf_counter_ns) of the most recent calls
+    of each phase. Percentiles are only computed when stats() or report() are called.
+    If dump_interval is set, report() is passed to dump every dump_interval seconds, checked at the end of
+    every profiled update.
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW, dump_interval: float | None = None,
+                 dump: Callable[[str], None] = print) -> None:
+        self.window = window
+        self.samples: dict[str, deque[int]] = {}
+        self.dump_interval = dump_interval
+        self.dump = dump
+        self.next_dump = time.monotonic() + dump_interval if dump_interval is not None else None
+
+    def record(self, phase: str, nanoseconds: int) -> None:
+        samples = self.samples.get(phase)
+        if samples is None:
+            samples = self.samples[phase] = deque(maxlen=self.window)
+        samples.append(nanoseconds)
+
+    def stats(self) -> dict[str, PhaseStats]:
+        stats = {}
+        for phase, samples in self.samples.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            stats[phase] = PhaseStats(len(ordered), percentile(ordered, 0.5) / 1000,
+                                      percentile(ordered, 0.99) / 1000, ordered[-1] / 1000)
+        return stats
+
+    def report(self) -> str:
+        lines = [f'{"phase":<28}{"count":>7}{"p50 us":>10}{"p99 us":>10}{"max us":>10}']
+        for phase, stats in self.stats().items():
+            lines.append(f'{phase:<28}{stats.count:>7}{stats.p50:>10.1f}'
+                         f'{stats.p99:>10.1f}{stats.max:>10.1f}')
+        return '\n'.join(lines)
+
+    def reset(self) -> None:
+        self.samples.clear()
+
+    def end_update(self) -> None:
+        # Dumps the report if the dump interval has passed
+        if self.next_dump is not None and time.monotonic() >= self.next_dump:
+            self.dump(self.report())
+            self.next_dump = time.monotonic() + self.dump_interval
+
+
+def test():
+    from game import Game, EventType
+    from headless import random_input
+
+    class Observer:
+        def update(self, game: Game, event: EventType):
+            pass
+
+        def update_batch(self, game: Game, events: list[EventType]):
+            pass
+
+    dumps = []
+    for batch_notifications in (False, True):
+        game = Game(gravity=5, seed=0, batch_notifications=batch_notifications)
+        game.register_observer(Observer())
+        game.profiler = PhaseProfiler(window=100, dump_interval=0, dump=dumps.append)
+        game.start()
+        next_input = random_input(0)
+        for frame in range(500):
+            if not game.alive:
+                game.start()
+            game.update(next_input(game, frame))
+
+        stats = game.profiler.stats()
+        assert stats['update'].count == 100
+        for phase in ('user_movements', 'vertical_movement', 'line_clears', 'death_check', 'observer:Observer'):
+            assert stats[phase].p50 <= stats[phase].p99 <= stats[phase].max
+        assert ('deliver_events' in stats) == batch_notifications
+    assert dumps and dumps[-1].startswith('phase')
+    print(game.profiler.report())
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,52 @@
+import pygame
+from pygame.locals import *
+
+from inputs import KeyEvent, UserInput
+
+MOVE_LEFT = K_LEFT
+MOVE_RIGHT = K_RIGHT
+ROTATE_CW = K_UP
+ROTATE_CCW = K_z
+ROTATE_180 = K_a
+HOLD = K_c
+SOFT_DROP = K_DOWN
+HARD_DROP = K_SPACE
+
+
+def user_input_from_keys(inputs: list[bool]) -> UserInput:
+    # Converts the output of pygame.key.get_pressed() to a UserInput
+    return UserInput(
+        move_left=inputs[MOVE_LEFT],
+        move_right=inputs[MOVE_RIGHT],
+        rotate_cw=inputs[ROTATE_CW],
+        rotate_ccw=inputs[ROTATE_CCW],
+        rotate_180=inputs[ROTATE_180],
+        hold=inputs[HOLD],
+        soft_drop=inputs[SOFT_DROP],
+        hard_drop=inputs[HARD_DROP]
+    )
+
+
+# Action (name of the corresponding Input field) of each key
+KEY_ACTIONS = {
+    MOVE_LEFT: 'move_left',
+    MOVE_RIGHT: 'move_right',
+    ROTATE_CW: 'rotate_cw',
+    ROTATE_CCW: 'rotate_ccw',
+    ROTATE_180: 'rotate_180',
+    HOLD: 'hold',
+    SOFT_DROP: 'soft_drop',
+    HARD_DROP: 'hard_drop'
+}
+
+
+def key_event_from_pygame(event: pygame.event.Event, time: float | None = None) -> KeyEvent | None:
+    """
+    Converts a KEYDOWN or KEYUP event to a KeyEvent, or returns None for other events and unbound keys.
+    pygame does not expose when an event happened, so time defaults to the time it is converted.
+    """
+    if event.type not in (KEYDOWN, KEYUP) or event.key not in KEY_ACTIONS:
+        return None
+    if time is None:
+        time = pygame.time.get_ticks()
+    return KeyEvent(KEY_ACTIONS[event.key], event.type == KEYDOWN, time)
@@ -0,0 +1,266 @@
+"""
+Records games as their seed plus the input of every frame, and plays them back.
+
+File format (little endian):
+    magic b'TPRP', version (u8), seed (u64), gravity (u16), number of frames (u32),
+    frames per second (u16, from version 2, version 1 replays are at 60 frames per second)
+    followed by runs of (input bitmask (u8), run length (LEB128 varint))
+
+Usage: python replay.py game.tprp [--realtime [--fps 60]]
+       python replay.py --test
+"""
+import argparse
+import math
+import random
+import struct
+import time
+from dataclasses import dataclass, field, fields
+
+from game import Game
+from inputs import GameInput
+
+MAGIC = b'TPRP'
+VERSION = 2
+HEADER = struct.Struct('<4sBQHI')
+TICK_RATE = struct.Struct('<H')
+DEFAULT_TICK_RATE = 60
+INPUT_FIELDS = [f.name for f in fields(GameInput)]
+
+
+def encode_input(game_input: GameInput) -> int:
+    # Bit i is set if the i-th field of GameInput is set
+    mask = 0
+    for i, name in enumerate(INPUT_FIELDS):
+        if getattr(game_input, name):
+            mask |= 1 << i
+    return mask
+
+
+def decode_input(mask: int) -> GameInput:
+    return GameInput(*((mask >> i) & 1 == 1 for i in range(len(INPUT_FIELDS))))
+
+
+# Every possible bitmask decoded in advance, since playback decodes one per frame
+DECODED_INPUTS = [decode_input(mask) for mask in range(1 << len(INPUT_FIELDS))]
+
+
+@dataclass
+class Replay:
+    """
+    A game's seed, gravity and frames per second,
+    and its per frame inputs as run length encoded (bitmask, count) pairs
+    """
+    seed: int
+    gravity: int
+    tick_rate: int = DEFAULT_TICK_RATE
+    runs: list[list[int]] = field(default_factory=list)
+
+    @property
+    def frames(self) -> int:
+        return sum(count for _, count in self.runs)
+
+    def add_frame(self, mask: int) -> None:
+        if self.runs and self.runs[-1][0] == mask:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([mask, 1])
+
+    def inputs(self):
+        # Yields the GameInput of every frame
+        for mask, count in self.runs:
+            game_input = DECODED_INPUTS[mask]
+            for _ in range(count):
+                yield game_input
+
+    def to_bytes(self) -> bytes:
+        data = bytearray(HEADER.pack(MAGIC, VERSION, self.seed,
+                         self.gravity, self.frames))
+        data += TICK_RATE.pack(self.tick_rate)
+        for mask, count in self.runs:
+            data.append(mask)
+            write_varint(data, count)
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Replay':
+        magic, version, seed, gravity, frames = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('Not a replay file')
+        if version not in (1, VERSION):
+            raise ValueError(f'Unsupported replay version {version}')
+        offset = HEADER.size
+        tick_rate = DEFAULT_TICK_RATE
+        if version >= 2:
+            tick_rate, = TICK_RATE.unpack_from(data, offset)
+            offset += TICK_RATE.size
+        replay = cls(seed, gravity, tick_rate)
+        while offset < len(data):
+            mask = data[offset]
+            count, offset = read_varint(data, offset + 1)
+            replay.runs.append([mask, count])
+        if replay.frames != frames:
+            raise ValueError('Replay file is truncated')
+        return replay
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'Replay':
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+def write_varint(data: bytearray, value: int) -> None:
+    while value >= 0x80:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def read_varint(data: bytes, offset: int) -> tuple[int, int]:
+    # Returns the value and the offset after it
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class ReplayRecorder:
+    """
+    Records the inputs given to a game. The game has to be seeded for it to be reproducible,
+    so an unseeded game is given a random seed, and a new one every time it is restarted.
+    """
+
+    def __init__(self, game: Game, tick_rate: int = DEFAULT_TICK_RATE) -> None:
+        self.game = game
+        self.tick_rate = tick_rate
+        self.unseeded = game.seed is None
+        self.reset()
+
+    def reset(self) -> None:
+        # Starts a new recording, to be called before the game is (re)started
+        if self.unseeded:
+            self.game.seed = random.randrange(2 ** 64)
+        self.replay = Replay(self.game.seed, self.game.gravity, self.tick_rate)
+
+    def update(self, game_input: GameInput) -> None:
+        """Records the input and updates the game with it, use in place of Game.update"""
+        self.replay.add_frame(encode_input(game_input))
+        self.game.update(game_input)
+
+
+def play_headless(replay: Replay) -> Game:
+    """Re-simulates the replay as fast as possible and returns the game in its final state"""
+    game = Game(replay.gravity, replay.seed)
+    game.start()
+    for game_input in replay.inputs():
+        game.update(game_input)
+    return game
+
+
+def play_realtime(replay: Replay, fps: int = 60) -> Game:
+    """
+    Re-simulates the replay at its original speed with the fixed time step of main.main: the game is
+    updated replay.tick_rate times per second, and drawn through View at most fps times per second
+    """
+    # Imported here so that headless playback does not require pygame
+    import pygame
+    from main import MAX_CATCH_UP_MS
+    from view import View
+
+    game = Game(replay.gravity, replay.seed, batch_notifications=True)
+    view = View(auto_render=False)
+    game.register_observer(view)
+    pygame.init()
+    game.start()
+
+    inputs = replay.inputs()
+    frames_left = replay.frames
+    tick_ms = 1000 / replay.tick_rate
+    frame_ms = 1000 / fps
+    simulated_until = next_render = pygame.time.get_ticks()
+    while frames_left:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return game
+
+        now = pygame.time.get_ticks()
+        simulated_until = max(simulated_until, now - MAX_CATCH_UP_MS)
+        while frames_left and simulated_until + tick_ms <= now:
+            simulated_until += tick_ms
+            game.update(next(inputs))
+            frames_left -= 1
+
+        if now >= next_render or not frames_left:
+            view.render_pending(game)
+            next_render = max(next_render + frame_ms, now)
+
+        wait = min(simulated_until + tick_ms, next_render) - pygame.time.get_ticks()
+        if wait > 0:
+            pygame.time.wait(math.ceil(wait))
+    pygame.quit()
+    return game
+
+
+def test():
+    # Recorded games play back to the same state
+    game = Game(seed=5)
+    recorder = ReplayRecorder(game)
+    game.start()
+    for i in range(600):
+        recorder.update(GameInput(hard_drop=i % 20 == 0, move_left=i % 40 < 10, rotate_cw=i % 30 == 0))
+    replay = Replay.from_bytes(recorder.replay.to_bytes())
+    played = play_headless(replay)
+    assert played.board.row_masks == game.board.row_masks and played.pieces_placed == game.pieces_placed
+
+    # A seeded game keeps its seed when restarted, an unseeded one gets a new seed and piece sequence every time
+    recorder.reset()
+    assert game.seed == recorder.replay.seed == 5 and recorder.replay.frames == 0
+    game = Game()
+    recorder = ReplayRecorder(game)
+    sequences = []
+    for _ in range(3):
+        recorder.reset()
+        game.start()
+        assert recorder.replay.seed == game.seed
+        sequences.append((game.seed, [game.queue.pop().type for _ in range(28)]))
+    assert len({seed for seed, _ in sequences}) == 3
+    assert len({tuple(sequence) for _, sequence in sequences}) == 3
+    print('replay tests passed')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play back a recorded game')
+    parser.add_argument('path', nargs='?', help='replay file to play')
+    parser.add_argument('--realtime', action='store_true',
+                        help='show the game at the original speed instead of simulating it headlessly')
+    parser.add_argument('--fps', type=int, default=60,
+                        help='maximum number of frames drawn per second when playing in real time')
+    parser.add_argument('--test', action='store_true', help='run the tests instead')
+    args = parser.parse_args()
+
+    if args.test:
+        test()
+        return
+    if args.path is None:
+        parser.error('the path of the replay to play is required')
+    replay = Replay.load(args.path)
+    start_time = time.perf_counter()
+    game = play_realtime(replay, args.fps) if args.realtime else play_headless(replay)
+    seconds = time.perf_counter() - start_time
+    print(f'{replay.frames} frames in {seconds:.2f}s '
+          f'({replay.frames / seconds:.0f} frames/s)')
+    print(f'Final score: {game.current_score}, pieces placed: {game.pieces_placed}, '
+          f'alive: {game.alive}')
+
+
+if __name__ == '__main__':
+    main()
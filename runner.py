@@ -0,0 +1,209 @@
+"""
+Plays many seeded games with a policy across a process pool and aggregates the results.
+
+Usage: python runner.py --games 100000 --policy random
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from typing import Callable, Iterator
+
+from game import Game, default_history_dict
+from lineclear import LineClear
+from movegen import Placement
+
+# A policy chooses where to place the current mino, and whether to hold first
+Policy = Callable[[Game], tuple[Placement, bool]]
+# Policies are created in each worker from their name and the seed of the game
+POLICIES: dict[str, Callable[[int], Policy]] = {}
+
+
+def register_policy(name: str):
+    def decorator(factory: Callable[[int], Policy]):
+        POLICIES[name] = factory
+        return factory
+    return decorator
+
+
+@register_policy('random')
+def random_policy(seed: int) -> Policy:
+    # Picks uniformly among all placements of the current and hold minos
+    rng = random.Random(seed)
+
+    def policy(game: Game) -> tuple[Placement, bool]:
+        hold = game.hold.allow_hold and rng.random() < 0.5
+        placements = game.get_placements(hold)
+        if not placements:
+            # The held mino is unable to spawn
+            hold = False
+            placements = game.get_placements()
+        return rng.choice(placements), hold
+    return policy
+
+
+@register_policy('lowest')
+def lowest_policy(seed: int) -> Policy:
+    # Picks the lowest placement of the current mino, preferring tspins
+    def policy(game: Game) -> tuple[Placement, bool]:
+        placements = game.get_placements()
+        return min(placements, key=lambda p: (not p.tspin, p.state.y)), False
+    return policy
+
+
+@register_policy('heuristic')
+def heuristic_policy(seed: int) -> Policy:
+    # Imported here so that the other policies do not require NumPy
+    from evaluation import HeuristicPolicy
+    return HeuristicPolicy()
+
+
+@register_policy('beam')
+def beam_policy(seed: int) -> Policy:
+    from beamsearch import BeamSearchPolicy
+    return BeamSearchPolicy()
+
+
+@dataclass
+class GameResult:
+    seed: int
+    score: int
+    pieces: int
+    line_clears: dict[LineClear, int]
+
+
+@dataclass
+class RunStats:
+    """Aggregated results of many games. Scores and lengths are kept as histograms, not per game."""
+    games: int = 0
+    line_clears: dict[LineClear, int] = field(
+        default_factory=default_history_dict)
+    scores: Counter = field(default_factory=Counter)
+    lengths: Counter = field(default_factory=Counter)
+    seconds: float = 0
+
+    def add(self, result: GameResult) -> None:
+        self.games += 1
+        for line_clear, count in result.line_clears.items():
+            self.line_clears[line_clear] = self.line_clears.get(
+                line_clear, 0) + count
+        self.scores[result.score] += 1
+        self.lengths[result.pieces] += 1
+
+    def merge(self, other: 'RunStats') -> None:
+        self.games += other.games
+        for line_clear, count in other.line_clears.items():
+            self.line_clears[line_clear] = self.line_clears.get(
+                line_clear, 0) + count
+        self.scores.update(other.scores)
+        self.lengths.update(other.lengths)
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.seconds if self.seconds else 0
+
+    def summary(self) -> str:
+        lines = [f'{self.games} games in {self.seconds:.2f}s '
+                 f'({self.games_per_second:.1f} games/s)']
+        lines.append('Score:  ' + describe(self.scores))
+        lines.append('Pieces: ' + describe(self.lengths))
+        for line_clear, count in self.line_clears.items():
+            lines.append(f'{line_clear.abbreviation}: {count}')
+        return '\n'.join(lines)
+
+
+def percentile(histogram: Counter, q: float) -> int:
+    # Smallest value with at least q of the samples less than or equal to it
+    total = sum(histogram.values())
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= q * total:
+            return value
+    return 0
+
+
+def describe(histogram: Counter) -> str:
+    total = sum(histogram.values())
+    if not total:
+        return 'n/a'
+    mean = sum(value * count for value, count in histogram.items()) / total
+    return (f'mean {mean:.1f}, p10 {percentile(histogram, 0.1)}, p50 {percentile(histogram, 0.5)}, '
+            f'p90 {percentile(histogram, 0.9)}, max {max(histogram)}')
+
+
+def play_game(seed: int, policy: Policy, max_pieces: int = 1000) -> GameResult:
+    """Plays a game until death or until max_pieces have been placed"""
+    game = Game(seed=seed)
+    game.start()
+    while game.alive and game.pieces_placed < max_pieces:
+        placement, hold = policy(game)
+        game.place(placement.state, hold, placement.last_move)
+    return GameResult(seed, game.current_score, game.pieces_placed, dict(game.line_clears))
+
+
+def run_chunk(args: tuple[str, list[int], int]) -> RunStats:
+    # Runs in a worker process, only the aggregated statistics of the chunk are sent back
+    policy_name, seeds, max_pieces = args
+    stats = RunStats()
+    for seed in seeds:
+        stats.add(play_game(
+            seed, POLICIES[policy_name](seed), max_pieces))
+    return stats
+
+
+def chunk_seeds(first_seed: int, games: int, chunk_size: int) -> Iterator[list[int]]:
+    for start in range(first_seed, first_seed + games, chunk_size):
+        yield list(range(start, min(start + chunk_size, first_seed + games)))
+
+
+def run(games: int, policy_name: str = 'random', first_seed: int = 0, workers: int | None = None,
+        chunk_size: int = 50, max_pieces: int = 1000, progress: Callable[[RunStats], None] | None = None) -> RunStats:
+    """
+    Plays games with seeds first_seed, first_seed + 1, ... across a pool of worker processes.
+    Chunks are aggregated as they complete, and progress (if given) is called with the running totals.
+    """
+    if policy_name not in POLICIES:
+        raise ValueError(f'Unknown policy {policy_name}')
+    stats = RunStats()
+    start_time = time.perf_counter()
+    tasks = ((policy_name, seeds, max_pieces)
+             for seeds in chunk_seeds(first_seed, games, chunk_size))
+    with Pool(workers) as pool:
+        for chunk_stats in pool.imap_unordered(run_chunk, tasks):
+            stats.merge(chunk_stats)
+            stats.seconds = time.perf_counter() - start_time
+            if progress is not None:
+                progress(stats)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Play seeded games with a policy across all cores')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first game, following games use consecutive seeds')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (defaults to the number of cores)')
+    parser.add_argument('--chunk-size', type=int, default=50,
+                        help='number of games per task sent to a worker')
+    parser.add_argument('--max-pieces', type=int, default=1000,
+                        help='games are stopped after this many pieces')
+    args = parser.parse_args()
+
+    def progress(stats: RunStats):
+        print(f'\r{stats.games}/{args.games} games '
+              f'({stats.games_per_second:.1f} games/s)', end='', flush=True)
+
+    stats = run(args.games, args.policy, args.seed, args.workers,
+                args.chunk_size, args.max_pieces, progress)
+    print()
+    print(stats.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""
+Tunes the weights of evaluation.HeuristicPolicy with the noisy cross-entropy method, playing seeded games
+across a process pool.
+
+Every generation samples a population of weight vectors from a normal distribution, and moves the
+distribution to the mean and spread of the best (elite) candidates. All candidates of a generation play the
+same seeds, so that they are compared on the same piece sequences. Games are played in rounds, and after each
+round but the last the worst candidates are dropped, so that most games are spent on promising candidates.
+The best weights found so far play every generation's seeds as well, and are only replaced by a candidate
+that scores higher on the same seeds.
+The state of the search is saved to a checkpoint after every generation, from which it can be resumed.
+
+Requires NumPy (pip install numpy).
+
+Usage: python tuner.py --generations 20 --population 40 --games 8 --checkpoint tuner.json
+       python tuner.py --generations 40 --checkpoint tuner.json --resume
+"""
+import argparse
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field, asdict
+from multiprocessing import Pool
+from typing import Callable
+
+import numpy as np
+
+from evaluation import DEFAULT_WEIGHTS, FEATURES, HeuristicPolicy, Weights
+from runner import play_game
+
+# Number of chunks of games handed to each worker per round. More chunks balance the load better when
+# games differ in length, fewer cut the overhead of sending tasks to and results from the workers
+CHUNKS_PER_WORKER = 4
+
+
+@dataclass
+class TunerSettings:
+    population: int = 40
+    # Fraction of the population whose weights the distribution is fitted to
+    elite_fraction: float = 0.25
+    # Games played by each candidate that is not dropped, over rounds rounds
+    games: int = 8
+    rounds: int = 2
+    # Fraction of the remaining candidates kept after each round but the last (never fewer than the elite)
+    keep_fraction: float = 0.5
+    max_pieces: int = 300
+    initial_std: float = 1.0
+    # Variance added to the fitted distribution, divided by the generation number, so that it does not
+    # collapse before the search has settled
+    noise: float = 1.0
+    seed: int = 0
+
+    def __post_init__(self):
+        # Every round has to play at least one game, for the candidates to be ranked after it
+        if not 1 <= self.rounds <= self.games:
+            raise ValueError(f'rounds has to be between 1 and games ({self.games}), got {self.rounds}')
+
+    @property
+    def elite(self) -> int:
+        return max(1, round(self.population * self.elite_fraction))
+
+
+@dataclass
+class GenerationStats:
+    generation: int
+    # Mean score of the best candidate, and of the elite
+    best: float
+    elite_mean: float
+    dropped: int
+    games: int
+    seconds: float
+    workers: int
+
+    @property
+    def games_per_core_second(self) -> float:
+        return self.games / (self.seconds * self.workers) if self.seconds else 0
+
+
+@dataclass
+class TunerState:
+    """Everything needed to resume a search, as saved in checkpoints"""
+    generation: int
+    mean: list[float]
+    std: list[float]
+    # State of the numpy random generator the candidates are sampled with
+    rng_state: dict
+    best_weights: list[float] | None = None
+    best_fitness: float | None = None
+    history: list[dict] = field(default_factory=list)
+
+    @classmethod
+    def initial(cls, settings: TunerSettings, weights: Weights = DEFAULT_WEIGHTS) -> 'TunerState':
+        return cls(0, weights.to_array().tolist(), [settings.initial_std] * len(FEATURES),
+                   np.random.default_rng(settings.seed).bit_generator.state)
+
+
+def save_checkpoint(state: TunerState, path: str) -> None:
+    # Written to a temporary file first, so that an interrupted save leaves the previous checkpoint intact
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(asdict(state), f, indent=2)
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path: str) -> TunerState:
+    with open(path) as f:
+        return TunerState(**json.load(f))
+
+
+def play_candidate(args: tuple[int, tuple[float, ...], int, int]) -> tuple[int, int]:
+    # Runs in a worker process, returning the candidate's index and the score of the game
+    index, weights, seed, max_pieces = args
+    return index, play_game(seed, HeuristicPolicy(Weights.from_array(weights)), max_pieces).score
+
+
+def evaluate_candidates(pool: Pool, workers: int, candidates: np.ndarray, seeds: list[int],
+                        settings: TunerSettings) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Plays the seeds with every candidate, round by round, dropping the worst candidates after each round
+    but the last. Returns the mean score of each candidate over the games it played, whether it played all
+    of them, and the number of games played.
+    """
+    totals = np.zeros(len(candidates))
+    played = np.zeros(len(candidates), dtype=np.int64)
+    remaining = list(range(len(candidates)))
+    rounds = np.array_split(seeds, settings.rounds)
+    for number, round_seeds in enumerate(rounds):
+        tasks = [(index, tuple(candidates[index]), int(seed), settings.max_pieces)
+                 for index in remaining for seed in round_seeds]
+        chunk_size = max(1, len(tasks) // (workers * CHUNKS_PER_WORKER))
+        for index, score in pool.imap_unordered(play_candidate, tasks, chunk_size):
+            totals[index] += score
+            played[index] += 1
+        if number < len(rounds) - 1:
+            keep = max(settings.elite, math.ceil(len(remaining) * settings.keep_fraction))
+            remaining = sorted(remaining, key=lambda index: -totals[index] / played[index])[:keep]
+    complete = np.zeros(len(candidates), dtype=bool)
+    complete[remaining] = True
+    return totals / np.maximum(played, 1), complete, int(played.sum())
+
+
+def run_generation(pool: Pool, state: TunerState, settings: TunerSettings, workers: int) -> GenerationStats:
+    """Samples and evaluates a generation, and updates state with the distribution fitted to its elite"""
+    start_time = time.perf_counter()
+    rng = np.random.default_rng()
+    rng.bit_generator.state = state.rng_state
+    mean = np.array(state.mean)
+    std = np.array(state.std)
+    candidates = rng.normal(mean, std, size=(settings.population, len(FEATURES)))
+    # The current mean is always a candidate, so that the best weights found so far are re-evaluated
+    candidates[0] = mean
+
+    # Every candidate of a generation plays the same seeds, which differ between generations
+    first_seed = settings.seed * 1_000_000 + state.generation * settings.games
+    seeds = list(range(first_seed, first_seed + settings.games))
+    fitness, complete, games = evaluate_candidates(pool, workers, candidates, seeds, settings)
+
+    ranked = [index for index in np.argsort(-fitness, kind='stable') if complete[index]]
+    elite = candidates[ranked[:settings.elite]]
+    state.generation += 1
+    state.mean = elite.mean(axis=0).tolist()
+    state.std = np.sqrt(elite.var(axis=0) + settings.noise / state.generation).tolist()
+    state.rng_state = rng.bit_generator.state
+    best = ranked[0]
+    # The best weights so far are scored again on this generation's seeds, as scores on different seeds
+    # cannot be compared
+    if state.best_weights is not None:
+        incumbent, _, incumbent_games = evaluate_candidates(pool, workers, np.array([state.best_weights]), seeds,
+                                                            settings)
+        state.best_fitness = float(incumbent[0])
+        games += incumbent_games
+    if state.best_fitness is None or fitness[best] > state.best_fitness:
+        state.best_weights = candidates[best].tolist()
+        state.best_fitness = float(fitness[best])
+
+    stats = GenerationStats(state.generation, float(fitness[best]), float(fitness[ranked[:settings.elite]].mean()),
+                            int((~complete).sum()), games, time.perf_counter() - start_time, workers)
+    state.history.append(asdict(stats))
+    return stats
+
+
+def tune(settings: TunerSettings, generations: int, workers: int | None = None, checkpoint: str | None = None,
+         resume: bool = False, progress: Callable[[GenerationStats], None] | None = None) -> TunerState:
+    """
+    Runs generations until state.generation reaches generations, resuming from checkpoint if resume is set
+    (the settings have to match those of the checkpointed run for the results to be the same).
+    """
+    if resume and checkpoint is not None and os.path.exists(checkpoint):
+        state = load_checkpoint(checkpoint)
+    else:
+        state = TunerState.initial(settings)
+    workers = workers or os.cpu_count() or 1
+    with Pool(workers) as pool:
+        while state.generation < generations:
+            stats = run_generation(pool, state, settings, workers)
+            if checkpoint is not None:
+                save_checkpoint(state, checkpoint)
+            if progress is not None:
+                progress(stats)
+    return state
+
+
+def test():
+    import tempfile
+
+    settings = TunerSettings(population=6, games=4, rounds=2, max_pieces=15)
+    uninterrupted = tune(settings, 2, workers=2)
+    assert uninterrupted.generation == 2 and len(uninterrupted.history) == 2
+    # Half of the candidates that are not in the elite are dropped after the first round
+    assert all(stats['dropped'] == 3 for stats in uninterrupted.history)
+    # and from the second generation on, the best weights so far play the generation's seeds again
+    assert [stats['games'] for stats in uninterrupted.history] == [6 * 2 + 3 * 2, 6 * 2 + 3 * 2 + 4]
+    # The best fitness is the score of the best weights on the seeds of the last generation
+    policy = HeuristicPolicy(Weights.from_array(uninterrupted.best_weights))
+    scores = [play_game(seed, policy, settings.max_pieces).score for seed in range(4, 8)]
+    assert uninterrupted.best_fitness == sum(scores) / len(scores)
+    try:
+        TunerSettings(games=2, rounds=3)
+        assert False, 'more rounds than games'
+    except ValueError:
+        pass
+
+    # Resuming from a checkpoint continues exactly where the search stopped
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'tuner.json')
+        tune(settings, 1, workers=2, checkpoint=path)
+        assert load_checkpoint(path).generation == 1
+        resumed = tune(settings, 2, workers=2, checkpoint=path, resume=True)
+    assert resumed.mean == uninterrupted.mean and resumed.best_weights == uninterrupted.best_weights
+    print('tuner tests passed')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune the heuristic policy weights with the cross-entropy method')
+    defaults = TunerSettings()
+    parser.add_argument('--generations', type=int, default=20,
+                        help='total number of generations, including those of a resumed run')
+    parser.add_argument('--population', type=int, default=defaults.population)
+    parser.add_argument('--elite-fraction', type=float, default=defaults.elite_fraction)
+    parser.add_argument('--games', type=int, default=defaults.games, help='games per candidate')
+    parser.add_argument('--rounds', type=int, default=defaults.rounds,
+                        help='rounds the games are played in, the worst candidates are dropped between rounds')
+    parser.add_argument('--keep-fraction', type=float, default=defaults.keep_fraction,
+                        help='fraction of the candidates kept after each round')
+    parser.add_argument('--max-pieces', type=int, default=defaults.max_pieces)
+    parser.add_argument('--initial-std', type=float, default=defaults.initial_std)
+    parser.add_argument('--noise', type=float, default=defaults.noise)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (defaults to the number of cores)')
+    parser.add_argument('--checkpoint', metavar='PATH', help='save the search state here after every generation')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint if it exists')
+    parser.add_argument('--test', action='store_true', help='run the tests instead')
+    args = parser.parse_args()
+
+    if args.test:
+        test()
+        return
+    try:
+        settings = TunerSettings(args.population, args.elite_fraction, args.games, args.rounds, args.keep_fraction,
+                                 args.max_pieces, args.initial_std, args.noise, args.seed)
+    except ValueError as error:
+        parser.error(str(error))
+
+    def progress(stats: GenerationStats):
+        print(f'Generation {stats.generation}: best {stats.best:.1f}, elite mean {stats.elite_mean:.1f}, '
+              f'{stats.dropped} dropped, {stats.games} games in {stats.seconds:.1f}s '
+              f'({stats.games_per_core_second:.2f} games per core-second)')
+
+    state = tune(settings, args.generations, args.workers, args.checkpoint, args.resume, progress)
+    games = sum(stats['games'] for stats in state.history)
+    core_seconds = sum(stats['seconds'] * stats['workers'] for stats in state.history)
+    print(f'{games} games, {games / core_seconds if core_seconds else 0:.2f} games per core-second')
+    print(f'Best mean score {state.best_fitness:.1f} with {Weights.from_array(state.best_weights)}')
+
+
+if __name__ == '__main__':
+    main()
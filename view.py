@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from mailbox import linesep
 import pygame
 from pygame.locals import *
@@ -8,23 +9,19 @@ from mino import Mino
 from pieceholder import Hold
 from piecequeue import PieceQueue
 from position import Position
+from layout import SCREEN_WIDTH, SCREEN_HEIGHT, BOARD_POSITION, HOLDER_POSITION, HOLDER_CELLS, \
+    PREVIEW_POSITION, PREVIEW_CELLS, PREVIEW_MARGIN, PREVIEW_PIECES, CELL_WIDTH, SCORE_POSITION
 
-SCREEN_WIDTH = 700
-SCREEN_HEIGHT = 700
-BOARD_POSITION = (200, 20)
-HOLDER_POSITION = (70, 50)
-HOLDER_CELLS = (4, 2)
-PREVIEW_POSITION = (550, 50)
-PREVIEW_CELLS = (4, 2)
-PREVIEW_MARGIN = 15
-CELL_WIDTH = 30
-
-SCORE_POSITION = (50, 200)
 FONT_COLOUR_NORMAL = (255, 255, 255)
 FONT_COLOUR_FOCUS = (255, 255, 0)
 LINE_SEPERATION = 25
 FONT = 'Calibri'
 FONT_SIZE = 30
+# Maximum number of rendered text surfaces kept by each View
+TEXT_CACHE_SIZE = 64
+# Area of the screen containing the score panel
+SCORE_AREA = pygame.Rect(SCORE_POSITION[0], SCORE_POSITION[1],
+                         BOARD_POSITION[0] - SCORE_POSITION[0], 12 * LINE_SEPERATION)
 
 
 def normalised_position_to_holder_position(cell: Position):
@@ -40,10 +37,16 @@ class RectangleSprite(pygame.sprite.Sprite):
 
 
 class View:
-    def __init__(self):
+    def __init__(self, auto_render: bool = True):
+        # If unset, game events only mark the view as out of date and render_pending draws it,
+        # so that the screen can be drawn at a different rate from the game's updates
+        self.auto_render = auto_render
+        self.needs_render = False
         self.surface = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.font.init()
         self.font = pygame.font.SysFont(FONT, FONT_SIZE)
+        # Rendered text surfaces keyed by (text, colour), least recently used first
+        self.text_cache: OrderedDict[tuple[str, tuple[int, int, int]], pygame.Surface] = OrderedDict()
 
     def update(self, game: Game, update_type: EventType = EventType.NORMAL):
         if update_type == EventType.LINE_CLEAR:
@@ -51,7 +54,28 @@ class View:
         elif update_type == EventType.DEATH:
             self.render_death(game)
 
-        self.render_game(game)
+        self.render_or_defer(game)
+
+    def update_batch(self, game: Game, events: list[EventType]):
+        # All events of a single tick, rendering only once
+        if EventType.LINE_CLEAR in events:
+            self.render_line_clear(game)
+        if EventType.DEATH in events:
+            self.render_death(game)
+
+        self.render_or_defer(game)
+
+    def render_or_defer(self, game: Game):
+        if self.auto_render:
+            self.render_game(game)
+        else:
+            self.needs_render = True
+
+    def render_pending(self, game: Game):
+        # Draws the game if it changed since the last render
+        if self.needs_render:
+            self.render_game(game)
+            self.needs_render = False
 
     def render_line_clear(self, game: Game):
         pass
@@ -125,7 +149,7 @@ class View:
         holder_sprite.draw(self.surface)
 
     def draw_previews(self, queue: PieceQueue):
-        preview_pieces = queue.peek(5)
+        preview_pieces = queue.peek(PREVIEW_PIECES)
         for i, piece in enumerate(preview_pieces):
             self.draw_preview(i, piece)
 
@@ -161,5 +185,104 @@ class View:
                         SCORE_POSITION[0], pos_y + LINE_SEPERATION)
 
     def write_line(self, text: str, x: int, y: int, colour: tuple[int, int, int] = FONT_COLOUR_NORMAL) -> None:
+        # Rendered text is cached, since the same lines are drawn every frame
+        self.surface.blit(self.render_text(text, colour), (x, y))
+
+    def render_text(self, text: str, colour: tuple[int, int, int]) -> pygame.Surface:
+        key = (text, colour)
+        if key in self.text_cache:
+            self.text_cache.move_to_end(key)
+            return self.text_cache[key]
         text_surface = self.font.render(text, True, colour)
-        self.surface.blit(text_surface, (x, y))
+        self.text_cache[key] = text_surface
+        if len(self.text_cache) > TEXT_CACHE_SIZE:
+            self.text_cache.popitem(last=False)
+        return text_surface
+
+
+# Areas of the screen containing the hold box and previews, cleared before they are redrawn
+HOLDER_AREA = pygame.Rect(HOLDER_POSITION[0], HOLDER_POSITION[1],
+                          HOLDER_CELLS[0] * CELL_WIDTH, (HOLDER_CELLS[1] + 1) * CELL_WIDTH)
+PREVIEW_AREA = pygame.Rect(PREVIEW_POSITION[0], PREVIEW_POSITION[1],
+                           PREVIEW_CELLS[0] * CELL_WIDTH,
+                           PREVIEW_PIECES * PREVIEW_CELLS[1] * (CELL_WIDTH + PREVIEW_MARGIN) + CELL_WIDTH)
+
+
+class DirtyRectView(View):
+    """
+    View that only redraws what changed since the previous render.
+    Board cells are blitted from one pre-filled surface per colour and compared against the colours drawn
+    last time, while the hold box, previews and score panel are redrawn only when their contents change.
+    Only the changed areas of the display are updated.
+    """
+
+    def __init__(self, auto_render: bool = True):
+        super().__init__(auto_render)
+        self.cell_surfaces: dict = {}
+        # Colour of each visible cell of the board (including shadow and mino) as last drawn,
+        # indexed by row * columns + column
+        self.drawn_cells: list | None = None
+        self.drawn_hold = None
+        self.drawn_previews = None
+        self.drawn_score = None
+
+    def render_game(self, game: Game):
+        first_render = self.drawn_cells is None
+        if first_render:
+            self.surface.fill('black')
+        dirty_rects = self.draw_changed_cells(game)
+
+        hold = game.hold.held_mino.type if game.hold.held_mino is not None else None
+        if hold != self.drawn_hold:
+            self.surface.fill('black', HOLDER_AREA)
+            self.draw_hold(game.hold)
+            dirty_rects.append(HOLDER_AREA)
+            self.drawn_hold = hold
+
+        previews = game.queue.peek_types(PREVIEW_PIECES)
+        if previews != self.drawn_previews:
+            self.surface.fill('black', PREVIEW_AREA)
+            self.draw_previews(game.queue)
+            dirty_rects.append(PREVIEW_AREA)
+            self.drawn_previews = previews
+
+        score = (list(game.line_clears.values()), game.previous_line_clear)
+        if score != self.drawn_score:
+            self.surface.fill('black', SCORE_AREA)
+            self.draw_score(game)
+            dirty_rects.append(SCORE_AREA)
+            self.drawn_score = score
+
+        if first_render:
+            pygame.display.flip()
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)
+
+    def draw_changed_cells(self, game: Game) -> list[pygame.Rect]:
+        board = game.board
+        cells = [colour for row in board.board_arr[:board.rows]
+                 for colour in row]
+        for mino in (game.get_shadow(), game.current_mino):
+            for block in mino.blocks:
+                if block.y < board.rows:  # Don't draw block if higher than top of board
+                    cells[block.y * board.columns + block.x] = mino.colour
+
+        dirty_rects = []
+        drawn_cells = self.drawn_cells
+        for i, colour in enumerate(cells):
+            if drawn_cells is not None and drawn_cells[i] == colour:
+                continue
+            row, column = divmod(i, board.columns)
+            x = BOARD_POSITION[0] + column * CELL_WIDTH
+            y = BOARD_POSITION[1] + (board.rows - 1 - row) * CELL_WIDTH
+            dirty_rects.append(self.surface.blit(
+                self.cell_surface(colour), (x, y)))
+        self.drawn_cells = cells
+        return dirty_rects
+
+    def cell_surface(self, colour) -> pygame.Surface:
+        if colour not in self.cell_surfaces:
+            surface = pygame.Surface((CELL_WIDTH, CELL_WIDTH))
+            surface.fill(colour)
+            self.cell_surfaces[colour] = surface
+        return self.cell_surfaces[colour]
@@ -0,0 +1,207 @@
+"""
+Zobrist hashing of boards and game states, and a bounded transposition table keyed by those hashes.
+
+Every feature of a position (an occupied cell, the type of the current piece, the held piece, ...) has its own
+random 64-bit key, and a position's hash is the XOR of the keys of its features. The board's part of the hash
+is kept up to date by Board and BoardManager as cells are filled and lines are cleared (see Board.hash).
+"""
+import random
+from dataclasses import dataclass
+
+import mino as mn
+from mino import Orientation
+
+# The keys are generated from a fixed seed, so hashes are the same in every process
+ZOBRIST_SEED = 0x7E7215
+# Number of upcoming pieces of the queue included in the hash of a game
+QUEUE_DEPTH = 5
+
+
+def generate_keys(count: int, seed: int) -> list[int]:
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(count)]
+
+
+def cell_keys(rows: int, columns: int) -> list[list[int]]:
+    # One key per cell, indexed by [y][x]
+    keys = generate_keys(rows * columns, ZOBRIST_SEED)
+    return [keys[y * columns:(y + 1) * columns] for y in range(rows)]
+
+
+def rows_hash(keys: list[list[int]], row_masks: list[int], start: int = 0) -> int:
+    """XOR of the keys of every occupied cell in the rows from start upwards"""
+    value = 0
+    for y in range(start, len(row_masks)):
+        row_mask = row_masks[y]
+        row_keys = keys[y]
+        x = 0
+        while row_mask:
+            if row_mask & 1:
+                value ^= row_keys[x]
+            row_mask >>= 1
+            x += 1
+    return value
+
+
+# Keys of the rest of the game, generated from a different seed than the cells
+_keys = iter(generate_keys(1000, ZOBRIST_SEED + 1))
+CURRENT_TYPE_KEYS = {mino_type: next(_keys) for mino_type in mn.MINO_TYPES}
+CURRENT_ORIENTATION_KEYS = {orientation: next(_keys) for orientation in Orientation}
+CURRENT_X_KEYS = [next(_keys) for _ in range(16)]
+CURRENT_Y_KEYS = [next(_keys) for _ in range(32)]
+HOLD_KEYS = {mino_type: next(_keys) for mino_type in mn.MINO_TYPES}
+HOLD_DISABLED_KEY = next(_keys)
+QUEUE_KEYS = [{mino_type: next(_keys) for mino_type in mn.MINO_TYPES} for _ in range(QUEUE_DEPTH)]
+
+
+def piece_hash(state: mn.PieceState) -> int:
+    # Positions are offset so that centers slightly outside of the board still have a key
+    return (CURRENT_TYPE_KEYS[state.type] ^ CURRENT_ORIENTATION_KEYS[state.orientation]
+            ^ CURRENT_X_KEYS[state.x + 2] ^ CURRENT_Y_KEYS[state.y + 2])
+
+
+def game_hash(game, include_position: bool = True) -> int:
+    """
+    Hash of the game's board, current piece, held piece (and whether holding is allowed) and the next
+    QUEUE_DEPTH pieces of the queue. If include_position is unset, only the current piece's type is hashed,
+    which suits searches over placements where the piece is always at its spawn position.
+    """
+    value = game.board.hash
+    mino = game.current_mino
+    if include_position:
+        value ^= piece_hash(mino.state)
+    else:
+        value ^= CURRENT_TYPE_KEYS[mino.type]
+    if game.hold.held_mino is not None:
+        value ^= HOLD_KEYS[game.hold.held_mino.type]
+    if not game.hold.allow_hold:
+        value ^= HOLD_DISABLED_KEY
+    for keys, piece in zip(QUEUE_KEYS, game.queue.peek_types(QUEUE_DEPTH)):
+        value ^= keys[piece]
+    return value
+
+
+@dataclass(slots=True)
+class Entry:
+    key: int
+    value: object
+    depth: int
+    generation: int
+
+
+class TranspositionTable:
+    """
+    Fixed size hash table from game hashes to search results.
+    Each hash maps to a single slot. A stored entry is replaced by an entry for the same position if the
+    new one was searched at least as deep, and by an entry for another position if it was searched at least
+    as deep or the stored one is from an earlier search (see new_search).
+    """
+
+    def __init__(self, size_bits: int = 16) -> None:
+        self.mask = (1 << size_bits) - 1
+        self.slots: list[Entry | None] = [None] * (1 << size_bits)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def __len__(self) -> int:
+        return self.stored
+
+    def lookup(self, key: int, depth: int = 0):
+        """Returns the value stored for key if it was searched at least depth deep, otherwise None"""
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry.key == key and entry.depth >= depth:
+            self.hits += 1
+            return entry.value
+        self.misses += 1
+        return None
+
+    def store(self, key: int, value, depth: int = 0) -> None:
+        index = key & self.mask
+        entry = self.slots[index]
+        if entry is None:
+            self.stored += 1
+        elif entry.depth > depth and (entry.key == key or entry.generation == self.generation):
+            return
+        self.slots[index] = Entry(key, value, depth, self.generation)
+
+    def new_search(self) -> None:
+        # Entries from earlier searches are kept, but are replaced first
+        self.generation += 1
+
+    def clear(self) -> None:
+        self.slots = [None] * len(self.slots)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+
+def test():
+    import board as bd
+    from board import Board
+    from game import Game
+    from position import Position
+
+    # The incremental hash matches a full recomputation after every placement, including line clears
+    cleared = 0
+    for seed in range(3):
+        game = Game(seed=seed)
+        game.start()
+        while game.alive and game.pieces_placed < 100:
+            # The placement with the lowest top, so that lines get cleared
+            placement = min(game.get_placements(), key=lambda p: (
+                p.state.y + bd.SHAPE_MASKS[(p.state.type, p.state.orientation)].top, p.state.y))
+            if game.place(placement.state, last_move=placement.last_move):
+                cleared += 1
+            assert game.board.hash == rows_hash(bd.CELL_KEYS, game.board.row_masks)
+    assert cleared > 10
+
+    # Equal boards reached in different ways hash equally, different boards differently
+    first = Board.from_row_masks([0b11, 0b1] + [0] * (bd.ROWS - 1))
+    second = Board()
+    for x, y in ((0, 0), (0, 1), (1, 0)):
+        second.set_cell_colour(Position(x, y), (255, 0, 0))
+    assert first.hash == second.hash != Board().hash == 0
+    # Clearing the bottom row moves the row above it down
+    cleared_board = Board.from_row_masks([bd.FULL_ROW, 0b10] + [0] * (bd.ROWS - 1))
+    bd.BoardManager(cleared_board).clear_lines([0])
+    assert cleared_board.hash == Board.from_row_masks([0b10] + [0] * bd.ROWS).hash
+
+    # Games differ by the current and held pieces
+    game = Game(seed=5)
+    game.start()
+    before = game_hash(game)
+    game.hold_mino()
+    assert game_hash(game) != before
+
+    # Deeper entries are kept over shallower ones from the same search, but not from earlier searches
+    table = TranspositionTable(size_bits=2)
+    table.store(1, 'deep', depth=3)
+    table.store(5, 'shallow', depth=1)
+    assert table.lookup(1) == 'deep' and table.lookup(5) is None
+    assert table.lookup(1, depth=4) is None
+    table.new_search()
+    table.store(5, 'new', depth=1)
+    assert table.lookup(5) == 'new' and table.lookup(1) is None
+
+    # A shallower result for the same position does not overwrite a deeper one, even from a later search
+    table.store(2, 'deep', depth=3)
+    table.new_search()
+    table.store(2, 'shallow', depth=1)
+    assert table.lookup(2) == 'deep'
+    table.store(2, 'deeper', depth=4)
+    assert table.lookup(2, depth=4) == 'deeper'
+    table.clear()
+    assert len(table) == table.hits == table.misses == table.generation == 0 and table.lookup(2) is None
+    print('zobrist tests passed')
+
+
+if __name__ == '__main__':
+    test()